@@ -1,8 +1,25 @@
 import streamlit as st
-from main import GroupDebateQA
+from main import GroupDebateQA, warm_up_stages
 from prompt import prompt_sam, debater_prompts
-from back_end import DEBATERS
-from utils import check_password, save_feedback
+from back_end import DEBATERS, COMPRESSION_ENABLED, COMPRESSION_MAX_CHARS
+from usage import total_tokens
+from utils import (check_password, save_feedback, profile_next_request, start_profiling, finish_profiling,
+                   render_profile, show_warm_up_status)
+from warmup import WarmUp
+
+# Maximum tokens for a chatbot session, 0 for unlimited
+SESSION_TOKEN_BUDGET = st.secrets.get("budget", {}).get("chat_session_tokens", 0)
+
+# Initialize the QA engine once per process, compressing context as configured in `[compression]`
+@st.cache_resource
+def initialize_qa_engine():
+    return GroupDebateQA(compression_max_chars=COMPRESSION_MAX_CHARS if COMPRESSION_ENABLED else None)
+
+# Warm up once per process in the background, while the first user logs in;
+# if creating the engine fails there, it is retried and reported after login
+@st.cache_resource
+def get_warm_up():
+    return WarmUp(warm_up_stages(initialize_qa_engine)).start()
 
 # Setup sidebar with instructions and feedback form
 def setup_sidebar():
@@ -39,6 +56,16 @@ def setup_sidebar():
     st.sidebar.markdown(f"**{selected_debater}**")
     st.sidebar.caption(DEBATERS[selected_debater]["description"])
 
+    # Panel mode asks several debaters the same question in parallel
+    st.sidebar.subheader("Panel Mode")
+    panel_mode = st.sidebar.toggle(
+        "Ask a panel of debaters",
+        key="panel_mode",
+        help="Each question is answered by every panel debater side by side"
+    )
+    if panel_mode:
+        st.sidebar.multiselect("Panel debaters", options=debater_options, key="panel_debaters")
+
     # Add controls for search parameters
     st.sidebar.subheader("Search Settings")
     # Store the k_value in session state so it persists between reruns
@@ -57,6 +84,11 @@ def setup_sidebar():
     if k_value != st.session_state["k_value"]:
         st.session_state["k_value"] = k_value
 
+    # Show token usage for this session
+    if st.session_state.get("usage"):
+        budget_text = f" of {SESSION_TOKEN_BUDGET:,}" if SESSION_TOKEN_BUDGET else ""
+        st.sidebar.caption(f"📊 Tokens used this session: {total_tokens(st.session_state['usage']):,}{budget_text}")
+
     # Add reset button
     if st.sidebar.button("Reset Conversation"):
         st.session_state["messages"] = []
@@ -95,6 +127,44 @@ def setup_sidebar():
     except:
         pass
 
+# Show an answer with its sources
+def show_answer(response):
+    """Show an answer and its sources, returning the markdown kept in the chat history."""
+    answer = response["answer"]
+    sources = response["sources"].strip()
+
+    # Display the answer
+    st.markdown(answer)
+    if response["cached"]:
+        st.caption(f"⚡ Answered from cache (similarity {response['similarity']:.2f})")
+
+    # Display sources in a more structured way
+    if sources:
+        with st.expander("View Sources"):
+            source_list = sources.split(", ")
+            for i, source in enumerate(source_list):
+                st.markdown(f"**Source {i+1}:** {source}")
+
+                # Find the corresponding document
+                for doc in response["documents"]:
+                    if doc.metadata.get('source', 'Unknown') == source:
+                        st.markdown(f"**Content:** {doc.page_content}")
+                        st.markdown("---")
+                        break
+
+    formatted_response = answer
+    if sources:
+        formatted_response += f"\n\n**Sources:**\n{sources}"
+    return formatted_response
+
+# Show the answers of a panel in one column per debater
+def show_panel_history(panel):
+    cols = st.columns(len(panel))
+    for col, entry in zip(cols, panel):
+        with col:
+            st.markdown(f"**{entry['debater']}**")
+            st.markdown(entry["content"])
+
 def main():
     """Main application function."""
     # Set page configuration
@@ -116,24 +186,33 @@ def main():
     if "feedback" not in st.session_state:
         st.session_state["feedback"] = ""
 
+    # Initialize session state for token usage
+    if "usage" not in st.session_state:
+        st.session_state["usage"] = []
+
     # Initialize session state for k_value
     if "k_value" not in st.session_state:
         st.session_state["k_value"] = 5
 
+    # Initialize session state for panel mode
+    if "panel_mode" not in st.session_state:
+        st.session_state["panel_mode"] = False
+    if "panel_debaters" not in st.session_state:
+        st.session_state["panel_debaters"] = list(DEBATERS.keys())
+
     setup_sidebar()
+    show_warm_up_status(get_warm_up())
 
     if not check_password():
         st.stop()
 
+    profile_next_request()
+
     # Add a title to the app
     st.title("Group Debate Chatbot")
     st.subheader("Ask questions about the group debates")
 
     # Initialize the QA engine
-    @st.cache_resource
-    def initialize_qa_engine():
-        return GroupDebateQA()
-
     try:
         qa_engine = initialize_qa_engine()
         st.success("✅ Successfully connected to Pinecone and OpenAI!")
@@ -144,7 +223,10 @@ def main():
     # Display chat messages
     for message in st.session_state["messages"]:
         with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+            if "panel" in message:
+                show_panel_history(message["panel"])
+            else:
+                st.markdown(message["content"])
 
     # Input for user query
     user_query = st.chat_input("Ask a question about the group debates...")
@@ -158,71 +240,93 @@ def main():
         with st.chat_message("user"):
             st.markdown(user_query)
 
-        # Get response from QA engine
-        with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
+        # Get response from QA engine, profiling it if an admin asked for it
+        profiler = start_profiling()
+        panel_debaters = st.session_state["panel_debaters"] if st.session_state["panel_mode"] else []
+        if len(panel_debaters) > 1:
+            with st.chat_message("assistant"):
+                # One column per debater, each filled in as soon as its answer arrives
+                cols = st.columns(len(panel_debaters))
+                placeholders = {}
+                for col, debater_name in zip(cols, panel_debaters):
+                    with col:
+                        st.markdown(f"**{debater_name}**")
+                        placeholders[debater_name] = st.empty()
+                        placeholders[debater_name].caption("Thinking...")
+
+                answers = {}
                 try:
-                    # Get the selected debater
-                    debater_name = st.session_state["selected_debater"]
-
-                    # Get the namespace for the selected debater
-                    namespace = DEBATERS[debater_name]["namespace"]
-
-                    # First get search results from the appropriate namespace
-                    k_value = st.session_state.get("k_value", 5)  # Get k value from session state
-                    similar_docs = qa_engine.search_similar_documents(user_query, k=k_value, namespace=namespace)
-
-                    # Get the appropriate prompt for the selected debater
-                    system_prompt = debater_prompts.get(debater_name, prompt_sam)
-
-                    # Use the custom context method for more reliable answers
-                    response = qa_engine.ask_question_with_custom_context(
-                        user_query, 
-                        search_results=similar_docs, 
-                        system_prompt=system_prompt,
-                        debater_name=debater_name
-                    )
-
-                    # Format answer with sources
-                    answer = response["answer"]
-                    sources = response["sources"].strip()
-
-                    # Display the answer
-                    st.markdown(answer)
-
-                    # Display sources in a more structured way
-                    if sources:
-                        with st.expander("View Sources"):
-                            source_list = sources.split(", ")
-                            for i, source in enumerate(source_list):
-                                st.markdown(f"**Source {i+1}:** {source}")
-
-                                # Find the corresponding document
-                                for doc in similar_docs:
-                                    if doc.metadata.get('source', 'Unknown') == source:
-                                        st.markdown(f"**Content:** {doc.page_content}")
-                                        st.markdown("---")
-                                        break
-
-                    # Add assistant message to chat history
-                    formatted_response = answer
-                    if sources:
-                        formatted_response += f"\n\n**Sources:**\n{sources}"
-
-                    st.session_state["messages"].append({"role": "assistant", "content": formatted_response})
-
-                    # Show similar documents in an expander
-                    with st.expander("View similar documents"):
-                        for i, doc in enumerate(similar_docs):
-                            st.markdown(f"**Document {i+1}**")
-                            st.markdown(f"**Content:** {doc.page_content}")
-                            st.markdown(f"**Source:** {doc.metadata.get('source', 'Unknown')}")
-                            st.markdown("---")
-
+                    for debater_name, response, error in qa_engine.answer_panel(
+                        user_query,
+                        panel_debaters,
+                        k=st.session_state.get("k_value", 5),
+                        usage_log=st.session_state["usage"],
+                        token_budget=SESSION_TOKEN_BUDGET
+                    ):
+                        with placeholders[debater_name].container():
+                            if error is None:
+                                answers[debater_name] = show_answer(response)
+                            else:
+                                answers[debater_name] = f"❌ Error generating response: {str(error)}"
+                                st.error(answers[debater_name])
                 except Exception as e:
-                    error_message = f"❌ Error generating response: {str(e)}"
-                    st.error(error_message)
-                    st.session_state["messages"].append({"role": "assistant", "content": error_message})
+                    st.error(f"❌ Error generating response: {str(e)}")
+
+                # Keep the panel in the chat history in the debaters' order
+                panel = [{"debater": name, "content": answers[name]} for name in panel_debaters if name in answers]
+                if panel:
+                    st.session_state["messages"].append({
+                        "role": "assistant",
+                        "content": "\n\n".join(f"**{entry['debater']}:** {entry['content']}" for entry in panel),
+                        "panel": panel
+                    })
+        else:
+            with st.chat_message("assistant"):
+                with st.spinner("Thinking..."):
+                    try:
+                        # A panel of one is answered by its only debater, otherwise by the selected one
+                        debater_name = panel_debaters[0] if panel_debaters else st.session_state["selected_debater"]
+
+                        k_value = st.session_state.get("k_value", 5)  # Get k value from session state
+
+                        # Get the appropriate prompt for the selected debater
+                        system_prompt = debater_prompts.get(debater_name, prompt_sam)
+
+                        # Search the debater's namespace and answer, reusing cached answers
+                        # to near-duplicate questions
+                        response = qa_engine.answer_question(
+                            user_query,
+                            debater_name=debater_name,
+                            k=k_value,
+                            system_prompt=system_prompt,
+                            usage_log=st.session_state["usage"],
+                            token_budget=SESSION_TOKEN_BUDGET
+                        )
+                        similar_docs = response["documents"]
+
+                        # Display the answer with its sources
+                        formatted_response = show_answer(response)
+
+                        # Add assistant message to chat history
+                        st.session_state["messages"].append({"role": "assistant", "content": formatted_response})
+
+                        # Show similar documents in an expander
+                        with st.expander("View similar documents"):
+                            for i, doc in enumerate(similar_docs):
+                                st.markdown(f"**Document {i+1}**")
+                                st.markdown(f"**Content:** {doc.page_content}")
+                                st.markdown(f"**Source:** {doc.metadata.get('source', 'Unknown')}")
+                                st.markdown("---")
+
+                    except Exception as e:
+                        error_message = f"❌ Error generating response: {str(e)}"
+                        st.error(error_message)
+                        st.session_state["messages"].append({"role": "assistant", "content": error_message})
+
+        if profiler is not None:
+            finish_profiling(profiler, "chat")
+
+    render_profile()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,215 @@
+"""
+Compact archive of finished debates for the simulator's gallery.
+
+An archive is a single file: a header pointing at a compressed JSON index,
+followed by one zlib-compressed JSON blob per debate. Only the index is read
+when the archive is opened; a debate is decompressed when it is loaded.
+Retrieved passages are stored once per debate in a source table and
+referenced by position from the knowledge context, the per-round sources and
+the follow-up responses.
+
+    python archive.py build gallery/debates.gda --topic "The future of artificial intelligence" \\
+        --debaters "Sam Altman" "Elon Musk" --rounds 3
+    python archive.py list gallery/debates.gda
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+MAGIC = b"GDA1"
+HEADER = struct.Struct("<4sQQ")  # magic, index offset, index length
+COMPRESSION_LEVEL = 9
+
+# Keys that are rebuilt on load rather than archived; token usage belongs to the
+# session that spends it, not to the debate that was built offline
+TRANSIENT_KEYS = ("prompt_prefixes", "follow_up_vectors", "retrieval_errors", "usage")
+
+
+def debate_id(topic, debaters, rounds):
+    """Return the archive id of a debate configuration."""
+    key = json.dumps([topic.strip().lower(), list(debaters), rounds])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def pack_state(state):
+    """Convert a debate state to its compact form with a deduplicated source table."""
+    table = []
+    positions = {}
+
+    def ref(item):
+        key = (item['content'], item['source'])
+        if key not in positions:
+            positions[key] = len(table)
+            table.append([item['content'], item['source']])
+        return positions[key]
+
+    packed = {key: value for key, value in state.items()
+              if key not in TRANSIENT_KEYS + ("knowledge_context", "sources", "user_questions")}
+    packed['source_table'] = table
+    packed['knowledge_context'] = {
+        debater: [ref(item) for item in items] for debater, items in state.get('knowledge_context', {}).items()
+    }
+    packed['sources'] = {
+        debater: {str(round_num): [ref(item) for item in items] for round_num, items in rounds.items()}
+        for debater, rounds in state.get('sources', {}).items()
+    }
+    packed['user_questions'] = [
+        {**q_data, 'responses': [{**resp, 'sources': [ref(item) for item in resp.get('sources', [])]}
+                                 for resp in q_data['responses']]}
+        for q_data in state.get('user_questions', [])
+    ]
+    return packed
+
+
+def unpack_state(packed):
+    """Rebuild a debate state from its compact form."""
+    table = [{'content': content, 'source': source} for content, source in packed['source_table']]
+
+    state = {key: value for key, value in packed.items() if key != 'source_table'}
+    state['knowledge_context'] = {
+        debater: [dict(table[idx]) for idx in refs] for debater, refs in packed['knowledge_context'].items()
+    }
+    state['sources'] = {
+        debater: {int(round_num): [dict(table[idx]) for idx in refs] for round_num, refs in rounds.items()}
+        for debater, rounds in packed['sources'].items()
+    }
+    state['user_questions'] = [
+        {**q_data, 'responses': [{**resp, 'sources': [dict(table[idx]) for idx in resp['sources']]}
+                                 for resp in q_data['responses']]}
+        for q_data in packed['user_questions']
+    ]
+    state['prompt_prefixes'] = {}
+    state['follow_up_vectors'] = []
+    state['retrieval_errors'] = []
+    state['usage'] = []
+    return state
+
+
+class DebateArchive:
+    def __init__(self, path):
+        """
+        Read and write an archive of finished debates.
+
+        Args:
+            path (str): Archive file path
+        """
+        self.path = path
+        self._index = None
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _read_index(self):
+        with open(self.path, "rb") as f:
+            magic, offset, length = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a debate archive")
+            f.seek(offset)
+            return json.loads(zlib.decompress(f.read(length)))
+
+    @property
+    def index(self):
+        """Return the archive index, reading it on first access."""
+        with self._lock:
+            if self._index is None:
+                self._index = self._read_index() if self.exists() else []
+            return self._index
+
+    def entries(self):
+        """Return the index entries (id, topic, debaters, rounds, created) of every debate."""
+        return [{key: value for key, value in entry.items() if key not in ("offset", "length")}
+                for entry in self.index]
+
+    def find(self, topic, debaters, rounds):
+        """Return the id of an archived debate with this configuration, or None."""
+        wanted = debate_id(topic, debaters, rounds)
+        return next((entry['id'] for entry in self.index if entry['id'] == wanted), None)
+
+    def load(self, entry_id):
+        """Decompress and return an archived debate state."""
+        entry = next((entry for entry in self.index if entry['id'] == entry_id), None)
+        if entry is None:
+            raise KeyError(entry_id)
+        with open(self.path, "rb") as f:
+            f.seek(entry['offset'])
+            blob = f.read(entry['length'])
+        return unpack_state(json.loads(zlib.decompress(blob)))
+
+    def add(self, state):
+        """Add or replace a finished debate, rewriting the archive file."""
+        entry_id = debate_id(state['topic'], state['debaters'], state['max_rounds'])
+        blob = zlib.compress(
+            json.dumps(pack_state(state), separators=(",", ":")).encode("utf-8"), COMPRESSION_LEVEL
+        )
+
+        # Copy the other debates' compressed blobs without decompressing them
+        blobs = []
+        if self.exists():
+            with open(self.path, "rb") as f:
+                for entry in self.index:
+                    if entry['id'] != entry_id:
+                        f.seek(entry['offset'])
+                        blobs.append((entry, f.read(entry['length'])))
+        blobs.append(({
+            'id': entry_id,
+            'topic': state['topic'],
+            'debaters': state['debaters'],
+            'rounds': state['max_rounds'],
+            'created': time.time()
+        }, blob))
+
+        index = []
+        tmp_path = f"{self.path}.tmp"
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, 0, 0))
+            for entry, data in blobs:
+                index.append({**entry, 'offset': f.tell(), 'length': len(data)})
+                f.write(data)
+            index_blob = zlib.compress(json.dumps(index).encode("utf-8"), COMPRESSION_LEVEL)
+            index_offset = f.tell()
+            f.write(index_blob)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, index_offset, len(index_blob)))
+        os.replace(tmp_path, self.path)
+
+        with self._lock:
+            self._index = index
+        return entry_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Generate a debate and add it to the archive")
+    build.add_argument("path")
+    build.add_argument("--topic", required=True)
+    build.add_argument("--debaters", nargs="+", required=True)
+    build.add_argument("--rounds", type=int, default=3)
+
+    listing = subparsers.add_parser("list", help="List the debates in an archive")
+    listing.add_argument("path")
+
+    args = parser.parse_args()
+    archive = DebateArchive(args.path)
+
+    if args.command == "build":
+        from back_end import generate_debate
+        state = generate_debate(args.topic, args.debaters, args.rounds)
+        print(f"Added {archive.add(state)}: {args.topic}")
+    else:
+        for entry in archive.entries():
+            print(f"{entry['id']}  {entry['rounds']} rounds  {', '.join(entry['debaters'])}  {entry['topic']}")
+        if archive.exists():
+            print(f"{os.path.getsize(args.path):,} bytes")
+
+
+if __name__ == "__main__":
+    main()
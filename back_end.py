@@ -1,10 +1,24 @@
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
 from langgraph.graph import StateGraph, END
+from langchain_core.runnables import RunnableConfig
 from typing import TypedDict, List, Dict, Literal, Union
 import streamlit as st
 import os
+from functools import lru_cache
+from itertools import combinations
 from prompt import debater_prompts
+from prompt_builder import PrefixCache, build_debater_prefix, build_turn_messages, prefix_key
+from convergence import ConvergenceDetector
+from metrics import METRICS
+from hedging import Hedger, DEFAULT_MAX_HEDGE_RATE, DEFAULT_PERCENTILE
+from routing import GEMINI_2_0_FLASH, ModelRouter
+from cancellation import Cancelled, count_wasted_tokens, raise_if_cancelled, run_cancellable
+from compression import ExtractiveCompressor, DEFAULT_MAX_CHARS
+from follow_up_memory import (FollowUpMemory, DEFAULT_MAX_CHARS as DEFAULT_MEMORY_MAX_CHARS, DEFAULT_MAX_RELEVANT,
+                              DEFAULT_OWN_RECENT)
+from cassette import Cassette
+from usage import budget_action, estimate_tokens, record_usage, total_tokens
 
 # Set API keys from Streamlit secrets
 os.environ["GOOGLE_API_KEY"] = st.secrets["general"]["GOOGLE_API_KEY"]
@@ -15,10 +29,41 @@ os.environ["LANGCHAIN_ENDPOINT"] = "https://api.smith.langchain.com"
 os.environ["LANGCHAIN_PROJECT"] = "debate-simulator"
 
 # Constants
-GEMINI_2_0_FLASH = "gemini-2.0-flash"
 EMBEDDING_MODEL = "models/text-embedding-004"
 INDEX_NAME = "groupdebate"
 
+# Documents retrieved per responder for a follow-up question, live or speculated
+FOLLOW_UP_K = 3
+
+# Record or replay Gemini and Pinecone traffic, configured with GROUPDEBATE_CASSETTE* variables
+CASSETTE = Cassette.from_env()
+
+# Provider-side cache for the static per-debater prompt prefix
+PREFIX_CACHE = PrefixCache()
+
+# Duplicate slow LLM requests, enabled with `[hedging] enabled = true` in secrets
+HEDGING_CONFIG = st.secrets.get("hedging", {})
+HEDGER = Hedger(
+    enabled=HEDGING_CONFIG.get("enabled", False),
+    percentile=HEDGING_CONFIG.get("percentile", DEFAULT_PERCENTILE),
+    max_hedge_rate=HEDGING_CONFIG.get("max_rate", DEFAULT_MAX_HEDGE_RATE)
+)
+
+# Pick the model per call type and prompt size; `[[routing.routes]]` in secrets replaces the default table
+ROUTER = ModelRouter(
+    routes=st.secrets.get("routing", {}).get("routes"),
+    hedger=HEDGER,
+    log_path=os.environ.get("GROUPDEBATE_ROUTING_LOG")
+)
+
+# Query-focused compression of retrieved chunks, disabled with `[compression] enabled = false` in secrets
+COMPRESSION_CONFIG = st.secrets.get("compression", {})
+COMPRESSION_ENABLED = COMPRESSION_CONFIG.get("enabled", True)
+COMPRESSION_MAX_CHARS = COMPRESSION_CONFIG.get("max_chars", DEFAULT_MAX_CHARS)
+
+# Earlier follow-ups repeated in a follow-up prompt, tuned with `[follow_up_memory]` in secrets
+FOLLOW_UP_MEMORY_CONFIG = st.secrets.get("follow_up_memory", {})
+
 # Define the debaters with descriptions and their corresponding namespaces
 DEBATERS = {
     "Sam Altman": {
@@ -50,43 +95,115 @@ class DebateState(TypedDict):
     user_questions: List[Dict[str, str]]  # To store user follow-up questions and responses
     knowledge_context: Dict[str, List[Dict]]  # To store retrieved knowledge for each debater
     sources: Dict[str, Dict[int, List[Dict[str, str]]]]  # To store sources for each debater by round
+    prompt_prefixes: Dict[str, str]  # Static system prompt for each debater, built once per debate
+    novelty: List[Dict[str, float]]  # Novelty of each debater's turn per completed round, from round 2
+    stop_reason: str  # Why the debate ended: "max_rounds", "converged" or "budget"
+    usage: List[Dict]  # Token usage of every LLM call, per debater and round
+    token_budget: int  # Maximum tokens for the debate and its follow-ups, 0 for unlimited
+    follow_up_vectors: List  # Embedding of each follow-up question, aligned with user_questions
+    retrieval_errors: List[str]  # Failed retrievals not yet shown to the user
 
 # Initialize Google Gemini API
-def get_llm(api_key, model=GEMINI_2_0_FLASH, temperature=0):
-    """Initialize and return the LLM based on the specified model."""    
-    return ChatGoogleGenerativeAI(
+def get_llm(api_key, model=GEMINI_2_0_FLASH, temperature=0, cached_content=None):
+    """Initialize and return the LLM based on the specified model."""
+    kwargs = {"cached_content": cached_content} if cached_content else {}
+    return CASSETTE.chat_model(model, lambda: ChatGoogleGenerativeAI(
         model=model,
         temperature=temperature,
-        api_key=api_key
-    )
+        api_key=api_key,
+        **kwargs
+    ))
+
+# Chat model whose system prompt is held in a provider cache
+class CachedPrefixModel:
+    """Send only the messages after the system prefix, which the cached content already contains."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def invoke(self, messages, *args, **kwargs):
+        return self.model.invoke(messages[1:], *args, **kwargs)
 
-# Initialize embeddings model
+# Initialize embeddings model, reusing one client per API key
+@lru_cache(maxsize=None)
 def get_embeddings(api_key):
     """Initialize and return the embeddings model."""
-    return GoogleGenerativeAIEmbeddings(
+    return CASSETTE.embeddings(lambda: GoogleGenerativeAIEmbeddings(
         model=EMBEDDING_MODEL,
         api_key=api_key
+    ))
+
+# Initialize the vector store for a namespace, reusing its connection across calls
+@lru_cache(maxsize=None)
+def get_vectorstore(namespace):
+    """Initialize and return the Pinecone vector store for a namespace."""
+    return CASSETTE.vectorstore(namespace, lambda: PineconeVectorStore(
+        index_name=INDEX_NAME,
+        embedding=get_embeddings(os.environ["GOOGLE_API_KEY"]),
+        namespace=namespace
+    ))
+
+# Open the connection to a vector store's index ahead of the first search
+def open_index(vectorstore):
+    """Make a cheap call to the store's Pinecone index; stores without one are skipped."""
+    index = getattr(vectorstore, "index", None)
+    if index is not None:
+        index.describe_index_stats()
+
+# Share one compressor, and its sentence embedding cache, across debates
+@lru_cache(maxsize=None)
+def get_compressor():
+    """Initialize and return the extractive compressor for retrieved knowledge."""
+    return ExtractiveCompressor(get_embeddings(os.environ["GOOGLE_API_KEY"]), max_chars=COMPRESSION_MAX_CHARS)
+
+# Share one follow-up memory across debates; the question embeddings live in each debate's state
+@lru_cache(maxsize=None)
+def get_follow_up_memory():
+    """Initialize and return the selector of earlier follow-ups for follow-up prompts."""
+    return FollowUpMemory(
+        get_embeddings(os.environ["GOOGLE_API_KEY"]),
+        max_relevant=FOLLOW_UP_MEMORY_CONFIG.get("max_relevant", DEFAULT_MAX_RELEVANT),
+        own_recent=FOLLOW_UP_MEMORY_CONFIG.get("own_recent", DEFAULT_OWN_RECENT),
+        max_chars=FOLLOW_UP_MEMORY_CONFIG.get("max_chars", DEFAULT_MEMORY_MAX_CHARS)
     )
 
-# Retrieve knowledge from Pinecone for a specific debater
-def retrieve_knowledge(topic, debater_name, k=5):
-    """Retrieve relevant knowledge for a debater on the given topic."""
-    try:
-        # Get the namespace for the debater
-        namespace = DEBATERS[debater_name]['namespace']
+# Keep only the parts of retrieved knowledge relevant to a topic or question
+def compress_knowledge(query, knowledge, query_vector=None, cancel_token=None):
+    """Return the knowledge compressed to the sentences most relevant to `query`.
 
-        # Initialize embeddings
-        embeddings = get_embeddings(os.environ["GOOGLE_API_KEY"])
+    The knowledge is returned unchanged if compression is disabled or fails.
+    Pass `query_vector` to reuse an existing embedding of the query.
+    """
+    if not COMPRESSION_ENABLED or not knowledge:
+        return knowledge
+    try:
+        if query_vector is None:
+            query_vector = run_cancellable(
+                cancel_token, "embedding", get_embeddings(os.environ["GOOGLE_API_KEY"]).embed_query, query
+            )
+        return run_cancellable(cancel_token, "embedding", get_compressor().compress, query_vector, knowledge)
+    except Exception:
+        return knowledge
 
-        # Initialize vector store with the appropriate namespace
-        vectorstore = PineconeVectorStore(
-            index_name=INDEX_NAME,
-            embedding=embeddings,
-            namespace=namespace
-        )
+# Retrieve knowledge from Pinecone for a specific debater
+def retrieve_knowledge(topic, debater_name, k=5, query_vector=None, cancel_token=None, errors=None):
+    """Retrieve relevant knowledge for a debater on the given topic.
+
+    Pass `query_vector` to reuse an existing embedding of the topic. The search
+    is abandoned with `Cancelled` if `cancel_token` is cancelled. This runs on
+    job threads, which cannot draw on the page, so a failure is appended to
+    `errors` for the script thread to show and no knowledge is returned.
+    """
+    try:
+        # Get the vector store for the debater's namespace
+        vectorstore = get_vectorstore(DEBATERS[debater_name]['namespace'])
 
         # Search for relevant documents
-        docs = vectorstore.similarity_search(topic, k=k)
+        if query_vector is None:
+            docs = run_cancellable(cancel_token, "retrieval", vectorstore.similarity_search, topic, k=k)
+        else:
+            docs = run_cancellable(cancel_token, "retrieval", vectorstore.similarity_search_by_vector,
+                                   query_vector, k=k)
 
         # Extract content and metadata
         results = []
@@ -98,15 +215,33 @@ def retrieve_knowledge(topic, debater_name, k=5):
 
         return results
     except Exception as e:
-        st.error(f"Error retrieving knowledge for {debater_name}: {str(e)}")
+        if errors is not None:
+            errors.append(f"Error retrieving knowledge for {debater_name}: {str(e)}")
         return []
 
+# Report debate progress to an optional callback
+def emit_progress(on_progress, stage, completed, total, **details):
+    """Send a progress event: stage, completed and total steps, fraction done and stage details."""
+    if on_progress is None:
+        return
+    on_progress({
+        'stage': stage,
+        'completed': completed,
+        'total': total,
+        'fraction': min(completed / total, 1.0) if total else 0.0,
+        **details
+    })
+
 # Create a debater node factory function to generate specific debater nodes
 def create_debater_node(debater_name):
     """Create a node function for a specific debater."""
 
-    def node_function(state: DebateState) -> DebateState:
-        model = get_llm(os.environ["GOOGLE_API_KEY"])
+    def node_function(state: DebateState, config: RunnableConfig) -> DebateState:
+        # Stop before doing any work if the debate was cancelled
+        configurable = config.get("configurable", {})
+        cancel_token = configurable.get("cancel_token")
+        raise_if_cancelled(cancel_token)
+        topic_vector = configurable.get("topic_vector")
 
         # Retrieve knowledge for this debater if not already in state
         if 'knowledge_context' not in state or debater_name not in state['knowledge_context']:
@@ -114,7 +249,10 @@ def create_debater_node(debater_name):
                 state['knowledge_context'] = {}
 
             # Retrieve knowledge from Pinecone
-            state['knowledge_context'][debater_name] = retrieve_knowledge(state['topic'], debater_name)
+            state['knowledge_context'][debater_name] = retrieve_knowledge(
+                state['topic'], debater_name, query_vector=topic_vector, cancel_token=cancel_token,
+                errors=state.setdefault('retrieval_errors', [])
+            )
 
         # Get the knowledge context for this debater
         knowledge = state['knowledge_context'].get(debater_name, [])
@@ -137,57 +275,63 @@ def create_debater_node(debater_name):
         # Add sources to the state
         state['sources'][debater_name][state['current_round']] = current_round_sources
 
-        # Format knowledge context
-        knowledge_context = ""
-        if knowledge:
-            knowledge_context = ""
-            for i, item in enumerate(knowledge):
-                knowledge_context += f"{i+1}. {item['content']}"
-
-        # Get the character prompt from the debater_prompts dictionary
-        character_prompt = debater_prompts.get(debater_name, "")
-
-        # Construct the prompt with character guidance and knowledge context
-        prompt = f"""
-        You are {debater_name}, participating in a debate on the topic: "{state['topic']}".
-
-        This is round {state['current_round']} of {state['max_rounds']}.
+        # Build the static prefix once per debate and reuse it unchanged on every turn
+        if 'prompt_prefixes' not in state:
+            state['prompt_prefixes'] = {}
+        if debater_name not in state['prompt_prefixes']:
+            state['prompt_prefixes'][debater_name] = build_debater_prefix(
+                debater_name,
+                state['topic'],
+                DEBATERS[debater_name]['description'],
+                debater_prompts.get(debater_name, ""),
+                compress_knowledge(state['topic'], knowledge, topic_vector, cancel_token)
+            )
+        prefix = state['prompt_prefixes'][debater_name]
+
+        # Only the round number and history change between turns
+        messages = build_turn_messages(
+            prefix,
+            debater_name,
+            state['debaters'],
+            state['current_round'],
+            state['max_rounds'],
+            state['history']
+        )
 
-        Character guidance for {debater_name}:
-        {character_prompt}
-        - {DEBATERS[debater_name]['description']}
-        - Use the speaking style, mannerisms, and viewpoints that {debater_name} is known for
-        - Reference relevant companies, projects, or initiatives that {debater_name} is associated with
-        - Make arguments that align with {debater_name}'s known positions
-        - limit your response to 1-2 paragraphs maximum and within 100 words.
-        {knowledge_context}
-
-        Previous exchanges in this round:
-        """
-
-        # Add previous exchanges for the current round
-        if state['current_round'] <= len(state['history']):
-            for i, debater in enumerate(state['debaters']):
-                if debater in state['history'][state['current_round'] - 1]:
-                    prompt += f"{debater}: {state['history'][state['current_round'] - 1][debater]}"
-
-        # Add previous rounds if applicable
-        if state['current_round'] > 1:
-            prompt += "Previous rounds:"
-            for round_idx in range(state['current_round'] - 1):
-                if round_idx < len(state['history']):
-                    prompt += f"Round {round_idx + 1}:"
-                    for debater in state['debaters']:
-                        if debater in state['history'][round_idx]:
-                            prompt += f"{debater}: {state['history'][round_idx][debater]}"
-
-        # Add instructions for the current speaker
-        prompt += f"Now, as {debater_name}, provide your argument for this round. Be persuasive, use facts, and stay in character. Keep your response concise (1-2 paragraphs maximum)."
+        # Keep the call within the token budget, dropping older rounds if needed
+        if 'usage' not in state:
+            state['usage'] = []
+        spent = total_tokens(state['usage'])
+        action = budget_action(spent, estimate_tokens(messages), state.get('token_budget'))
+        if action == "shrink":
+            messages = build_turn_messages(
+                prefix,
+                debater_name,
+                state['debaters'],
+                state['current_round'],
+                state['max_rounds'],
+                state['history'],
+                max_previous_rounds=1
+            )
+            action = budget_action(spent, estimate_tokens(messages), state.get('token_budget'))
+        if action != "ok":
+            state['stop_reason'] = "budget"
+            return state
+
+        # Provider caches are per model, so the prefix is attached for the routed model
+        def make_model(model_name, temperature):
+            cached_content = PREFIX_CACHE.attach(f"{model_name}/{prefix_key(debater_name, prefix)}", prefix)
+            model = get_llm(os.environ["GOOGLE_API_KEY"], model_name, temperature, cached_content=cached_content)
+            return CachedPrefixModel(model) if cached_content else model
 
         # Generate response with error handling
         try:
-            response = model.invoke(prompt)
+            response, model_name = run_cancellable(
+                cancel_token, "debate_turn", ROUTER.invoke, "debate_turn", messages, make_model, estimate_tokens(messages)
+            )
             response_text = response.content
+            record_usage(state['usage'], response, "simulator", "debate_turn", debater_name, state['current_round'],
+                         model=model_name)
 
             # Update state
             if state['current_round'] > len(state['history']):
@@ -204,6 +348,18 @@ def create_debater_node(debater_name):
             else:
                 state['history'][state['current_round'] - 1][debater_name] = fallback_text
 
+        # Report the finished turn; retrieval for every debater counts as the first steps
+        turns_done = sum(len(round_data) for round_data in state['history'])
+        emit_progress(
+            configurable.get("on_progress"),
+            "turn",
+            len(state['debaters']) + turns_done,
+            configurable.get("total_steps", 0),
+            debater=debater_name,
+            round=state['current_round'],
+            tokens=total_tokens(state['usage'])
+        )
+
         # Update the current speaker index
         state['current_speaker_idx'] = (state['current_speaker_idx'] + 1) % len(state['debaters'])
 
@@ -215,10 +371,44 @@ def create_debater_node(debater_name):
 
     return node_function
 
+# Router node that ends the debate early once arguments stop changing
+def create_router_node():
+    """Create the router node, checking for convergence at each round boundary."""
+
+    def router_node(state: DebateState, config: RunnableConfig) -> DebateState:
+        configurable = config.get("configurable", {})
+        raise_if_cancelled(configurable.get("cancel_token"))
+        # The graph is shared, so the debate's detector comes with the config
+        detector = configurable.get("detector")
+
+        if state.get('stop_reason'):
+            return state
+
+        if state['current_round'] > state['max_rounds']:
+            state['stop_reason'] = "max_rounds"
+            return state
+
+        # A round has just completed when the first speaker is up again
+        completed_round = state['current_round'] - 1
+        if detector is not None and state['current_speaker_idx'] == 0 and completed_round >= 1:
+            try:
+                converged, novelty = detector.converged(state['debaters'], state['history'], completed_round)
+            except Exception:
+                # Keep debating if novelty cannot be measured
+                return state
+            if novelty:
+                state.setdefault('novelty', []).append(novelty)
+            if converged:
+                state['stop_reason'] = "converged"
+
+        return state
+
+    return router_node
+
 # Router function to determine which debater should speak next
 def router(state: DebateState) -> Union[Literal["end"], str]:
     # Check if debate is complete
-    if state['current_round'] > state['max_rounds']:
+    if state.get('stop_reason') or state['current_round'] > state['max_rounds']:
         return "end"
 
     # Get the next speaker
@@ -233,8 +423,8 @@ def create_debate_graph(debaters):
     for debater in debaters:
         workflow.add_node(debater, create_debater_node(debater))
 
-    # Add a router node
-    workflow.add_node("router", lambda state: state)
+    # Add a router node, which ends the debate early if the config has a convergence detector
+    workflow.add_node("router", create_router_node())
 
     # Connect each debater to the router
     for debater in debaters:
@@ -255,8 +445,46 @@ def create_debate_graph(debaters):
 
     return workflow.compile()
 
+# Compiled graphs are reused across debates with the same debaters; the speaking
+# order comes from the state, so every ordering of them shares one graph
+def get_debate_graph(debaters):
+    """Return the compiled debate graph for debaters selected in any order."""
+    return compile_debate_graph(tuple(sorted(debaters)))
+
+@lru_cache(maxsize=64)
+def compile_debate_graph(debaters):
+    return create_debate_graph(list(debaters))
+
+# Compile the graphs of every selection of two to four debaters
+def precompile_debate_graphs(max_debaters=4):
+    for size in range(2, max_debaters + 1):
+        for debaters in combinations(DEBATERS, size):
+            get_debate_graph(debaters)
+
+# Cold-start work to do in the background while the first user logs in
+def warm_up_stages():
+    """Return the (name, callable) warm-up stages of the debate simulator."""
+    api_key = os.environ["GOOGLE_API_KEY"]
+    stages = [("Embeddings", lambda: get_embeddings(api_key).embed_query("warm-up"))]
+    for name, debater in DEBATERS.items():
+        stages.append((f"{name}'s index",
+                       lambda namespace=debater['namespace']: open_index(get_vectorstore(namespace))))
+    stages.append(("Debate graphs", precompile_debate_graphs))
+    return stages
+
 # Function to generate a debate
-def generate_debate(topic, debaters, num_rounds):
+def generate_debate(topic, debaters, num_rounds, convergence_threshold=None, token_budget=0, cancel_token=None,
+                    on_progress=None):
+    """Run a debate, optionally ending early once novelty drops below `convergence_threshold`.
+
+    `token_budget` caps the tokens used by the debate and its follow-ups; 0 is unlimited.
+    Cancelling `cancel_token` aborts the debate with `Cancelled`. `on_progress`
+    is called with an event after each debater's retrieval and each turn.
+    """
+    raise_if_cancelled(cancel_token)
+    CASSETTE.note("debate", topic=topic, debaters=list(debaters), num_rounds=num_rounds,
+                  convergence_threshold=convergence_threshold, token_budget=token_budget)
+
     # Initialize the state
     initial_state = {
         'topic': topic,
@@ -267,7 +495,14 @@ def generate_debate(topic, debaters, num_rounds):
         'current_speaker_idx': 0,
         'user_questions': [],
         'knowledge_context': {},
-        'sources': {}
+        'sources': {},
+        'prompt_prefixes': {},
+        'novelty': [],
+        'stop_reason': "",
+        'usage': [],
+        'token_budget': token_budget,
+        'follow_up_vectors': [],
+        'retrieval_errors': []
     }
     
     # Initialize sources dictionary for each debater
@@ -275,19 +510,128 @@ def generate_debate(topic, debaters, num_rounds):
         initial_state['sources'][debater] = {}
 
     # Pre-fetch knowledge for all debaters
-    for debater in debaters:
-        initial_state['knowledge_context'][debater] = retrieve_knowledge(topic, debater)
+    # One step per debater's retrieval plus one per turn
+    total_steps = len(debaters) * (num_rounds + 1)
 
-    # Create and run the graph with individual debater nodes
-    graph = create_debate_graph(debaters)
-    final_state = graph.invoke(initial_state)
+    try:
+        # Embed the topic once for every debater's retrieval and compression
+        try:
+            topic_vector = run_cancellable(
+                cancel_token, "embedding", get_embeddings(os.environ["GOOGLE_API_KEY"]).embed_query, topic
+            )
+        except Exception:
+            topic_vector = None
+
+        for idx, debater in enumerate(debaters, 1):
+            initial_state['knowledge_context'][debater] = retrieve_knowledge(
+                topic, debater, query_vector=topic_vector, cancel_token=cancel_token,
+                errors=initial_state['retrieval_errors']
+            )
+            emit_progress(on_progress, "retrieval", idx, total_steps, debater=debater, tokens=0)
+
+        # Run the shared graph with individual debater nodes; the convergence
+        # detector belongs to this debate, so it is passed with the config
+        detector = None
+        if convergence_threshold:
+            detector = ConvergenceDetector(get_embeddings(os.environ["GOOGLE_API_KEY"]), threshold=convergence_threshold)
+        graph = get_debate_graph(debaters)
+        final_state = graph.invoke(initial_state, config={"configurable": {
+            "detector": detector,
+            "cancel_token": cancel_token,
+            "on_progress": on_progress,
+            "total_steps": total_steps,
+            "topic_vector": topic_vector
+        }})
+    except Cancelled:
+        # Every turn generated so far is thrown away with the debate
+        METRICS.inc("cancellations_total", work="debate", reason=cancel_token.reason)
+        count_wasted_tokens(total_tokens(initial_state['usage']), "debate_turn")
+        METRICS.flush()
+        raise
+    METRICS.flush()
 
     return final_state
 
+# Build the prompt for a follow-up answer
+def build_follow_up_prompt(state, responder_name, question, knowledge_context, full_context=True,
+                           previous_exchanges=None):
+    """Build a follow-up prompt; without `full_context` only the last round is included.
+
+    `previous_exchanges` are the earlier follow-ups to include, by default all of them.
+    """
+    # Get the character prompt from the debater_prompts dictionary
+    character_prompt = debater_prompts.get(responder_name, "")
+
+    # Construct the prompt with context from the debate and knowledge
+    parts = [f"""
+        You are {responder_name}, who just participated in a debate on the topic: "{state['topic']}".
+        {character_prompt}
+
+        The debate history was:
+        """]
+
+    # Add the debate rounds to the prompt, skipping empty rounds
+    rounds = [(round_idx, round_data) for round_idx, round_data in enumerate(state['history']) if round_data]
+    if not full_context:
+        rounds = rounds[-1:]
+    for round_idx, round_data in rounds:
+        parts.append(f"Round {round_idx + 1}:")
+        for debater, response in round_data.items():
+            parts.append(f"{debater}: {response}")
+
+    # Add previous user questions if any
+    if previous_exchanges is None:
+        previous_exchanges = state['user_questions']
+    if full_context and previous_exchanges:
+        parts.append("Previous follow-up questions and responses:")
+        for q_data in previous_exchanges:
+            parts.append(f"User: {q_data['question']}")
+            for resp in q_data['responses']:
+                parts.append(f"{resp['responder']}: {resp['response']}")
+
+    # Add the current question and knowledge context
+    parts.append(f"A user has asked you a follow-up question: {question}")
+    parts.append(knowledge_context)
+    parts.append(f"As {responder_name}, respond to this question based on your character, knowledge, and the debate that just occurred. Keep your response concise (1-2 paragraphs maximum).")
+    return "".join(parts)
+
 # Function to handle user follow-up questions
-def handle_follow_up_question(state, question, responder_names):
-    """Process a follow-up question from the user and get responses from the specified debaters."""
-    model = get_llm(os.environ["GOOGLE_API_KEY"])
+def handle_follow_up_question(state, question, responder_names, speculation=None, cancel_token=None):
+    """Process a follow-up question from the user and get responses from the specified debaters.
+
+    If a `SpeculativeRetriever` is passed, its precomputed results are reused
+    when the question matches one of its speculated queries. Cancelling
+    `cancel_token` aborts the question with `Cancelled` and leaves the state
+    without it.
+    """
+    CASSETTE.note("follow_up", question=question, responders=list(responder_names))
+    if 'usage' not in state:
+        state['usage'] = []
+    spent_before = total_tokens(state['usage'])
+    try:
+        return _answer_follow_up(state, question, responder_names, speculation, cancel_token)
+    except Cancelled:
+        # Responses given so far are dropped along with the question
+        METRICS.inc("cancellations_total", work="follow_up", reason=cancel_token.reason)
+        count_wasted_tokens(total_tokens(state['usage']) - spent_before, "follow_up")
+        METRICS.flush()
+        raise
+
+def _answer_follow_up(state, question, responder_names, speculation, cancel_token):
+    """Get every responder's answer to a follow-up question and add it to the state."""
+    def make_model(model_name, temperature):
+        return get_llm(os.environ["GOOGLE_API_KEY"], model_name, temperature)
+
+    # Embed the question once for every responder
+    try:
+        question_vector = run_cancellable(
+            cancel_token, "embedding", get_embeddings(os.environ["GOOGLE_API_KEY"]).embed_query, question
+        )
+    except Exception:
+        question_vector = None
+
+    # Earlier follow-ups are selected per responder rather than repeated in full
+    memory = get_follow_up_memory()
 
     # Add the question to the state first
     question_entry = {
@@ -300,8 +644,14 @@ def handle_follow_up_question(state, question, responder_names):
         # Get the knowledge context for this debater
         knowledge = state['knowledge_context'].get(responder_name, [])
 
-        # Retrieve additional knowledge specific to the question if needed
-        question_knowledge = retrieve_knowledge(question, responder_name, k=3)
+        # Retrieve additional knowledge specific to the question, preferring speculated results
+        question_knowledge = None
+        if speculation is not None and question_vector is not None:
+            question_knowledge = speculation.lookup(question_vector, responder_name)
+        if question_knowledge is None:
+            question_knowledge = retrieve_knowledge(question, responder_name, k=FOLLOW_UP_K,
+                                                    query_vector=question_vector, cancel_token=cancel_token,
+                                                    errors=state.setdefault('retrieval_errors', []))
 
         # Combine existing knowledge with question-specific knowledge
         all_knowledge = knowledge + question_knowledge
@@ -315,50 +665,38 @@ def handle_follow_up_question(state, question, responder_names):
                     'source': item['source']
                 })
 
-        # Format knowledge context
+        # Format knowledge context, keeping only the sentences relevant to the question
         knowledge_context = ""
-        if all_knowledge:
+        prompt_knowledge = compress_knowledge(question, all_knowledge, question_vector, cancel_token)
+        if prompt_knowledge:
             knowledge_context = "Relevant knowledge for your reference:"
-            for i, item in enumerate(all_knowledge):
+            for i, item in enumerate(prompt_knowledge):
                 knowledge_context += f"{i+1}. {item['content']}"
-        # Get the character prompt from the debater_prompts dictionary
-        character_prompt = debater_prompts.get(responder_name, "")
-
-        # Construct the prompt with context from the debate and knowledge
-        prompt = f"""
-        You are {responder_name}, who just participated in a debate on the topic: "{state['topic']}".
-        {character_prompt}
-
-        The debate history was:
-        """
-
-        # Add all debate rounds to the prompt
-        for round_idx, round_data in enumerate(state['history']):
-            if round_data:  # Skip empty rounds
-                prompt += f"Round {round_idx + 1}:"
-                for debater, response in round_data.items():
-                    prompt += f"{debater}: {response}"
-
-        # Add previous user questions if any
-        if state['user_questions']:
-            prompt += "Previous follow-up questions and responses:"
-            for q_data in state['user_questions']:
-                prompt += f"User: {q_data['question']}"
-                for resp in q_data['responses']:
-                    prompt += f"{resp['responder']}: {resp['response']}"
-
-        # Add the current question and knowledge context
-        prompt += f"A user has asked you a follow-up question: {question}"
-        prompt += knowledge_context
-        prompt += f"As {responder_name}, respond to this question based on your character, knowledge, and the debate that just occurred. Keep your response concise (1-2 paragraphs maximum)."
+        # Keep the call within the token budget, dropping older context if needed
+        if 'usage' not in state:
+            state['usage'] = []
+        spent = total_tokens(state['usage'])
+        previous_exchanges = memory.select(state, responder_name, question_vector)
+        prompt = build_follow_up_prompt(state, responder_name, question, knowledge_context,
+                                        previous_exchanges=previous_exchanges)
+        action = budget_action(spent, estimate_tokens(prompt), state.get('token_budget'))
+        if action == "shrink":
+            prompt = build_follow_up_prompt(state, responder_name, question, knowledge_context, full_context=False)
+            action = budget_action(spent, estimate_tokens(prompt), state.get('token_budget'))
 
         # Generate response with error handling
-        try:
-            response = model.invoke(prompt)
-            response_text = response.content
-        except Exception:
-            # Provide a fallback response
-            response_text = f"As {responder_name}, I appreciate your question but am unable to provide a detailed response at this time."
+        if action != "ok":
+            response_text = f"As {responder_name}, I'd love to keep talking, but this session has reached its usage limit."
+        else:
+            try:
+                response, model_name = run_cancellable(
+                    cancel_token, "follow_up", ROUTER.invoke, "follow_up", prompt, make_model, estimate_tokens(prompt)
+                )
+                response_text = response.content
+                record_usage(state['usage'], response, "simulator", "follow_up", responder_name, model=model_name)
+            except Exception:
+                # Provide a fallback response
+                response_text = f"As {responder_name}, I appreciate your question but am unable to provide a detailed response at this time."
 
         # Add this response to the question entry
         question_entry['responses'].append({
@@ -367,7 +705,8 @@ def handle_follow_up_question(state, question, responder_names):
             'sources': question_sources
         })
 
-    # Add the complete question and responses to the state
-    state['user_questions'].append(question_entry)
+    # Add the complete question and responses to the state, indexed by its embedding
+    memory.remember(state, question_entry, question_vector)
+    METRICS.flush()
 
     return state
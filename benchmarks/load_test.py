@@ -0,0 +1,277 @@
+"""
+Load test both Streamlit apps with many concurrent simulated sessions.
+
+Each session runs the real app script through Streamlit's AppTest, in the same
+process so `st.cache_resource` objects are shared exactly like on a server.
+Gemini and Pinecone are replaced with local stand-ins that inject latency.
+
+    python -m benchmarks.load_test --sessions 50 --app both
+    python -m benchmarks.load_test --sessions 20 --app chatbot --llm-latency 1.5
+"""
+import argparse
+import ast
+import contextlib
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import streamlit as st
+from streamlit import config
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest, app_test
+from streamlit.testing.v1.util import build_mock_config_get_option
+
+from stand_ins import LocalVectorStore, StandInChatModel, StandInEmbeddings
+
+PASSWORD = "load-test"
+SECRETS = {
+    "password": PASSWORD,
+    "general": {"GOOGLE_API_KEY": "load-test", "PINECONE_API_KEY": "load-test", "OPENAI_API_KEY": "load-test"},
+    "tracing": {"LANGCHAIN_API_KEY": "load-test"},
+}
+QUESTIONS = [
+    "What do you think about AGI safety?",
+    "How should AI be regulated?",
+    "Will AI replace programmers?",
+    "What is the biggest risk of open source models?",
+    "How much compute will frontier models need?",
+]
+
+
+def share_app_test_globals():
+    """
+    Pin the process globals that AppTest swaps on every run.
+
+    AppTest installs a mock Runtime, the test secrets and a patched
+    `config.get_option` at the start of each run and removes them at the end,
+    which breaks runs of other sessions in flight. One shared runtime, set of
+    secrets and config override are installed instead.
+    """
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+
+    # AppTest only touches the class it imported, so give it a stand-in to assign to
+    app_test.Runtime = type("AppTestRuntime", (), {})
+
+    config.get_option = build_mock_config_get_option({"global.appTest": True})
+    app_test.patch_config_options = lambda overrides: contextlib.nullcontext()
+
+    secrets = Secrets()
+    secrets._secrets = SECRETS
+    st.secrets = secrets
+
+
+def serialize_ast_use():
+    """
+    Run Python parsing and script compilation one at a time.
+
+    Compiling a debate graph parses node sources with `ast.parse`, and every
+    AppTest session compiles its script through `ast`. On some CPython 3.11
+    releases these race across threads and hang or fail a session, so both go
+    through one lock. The apps never compile concurrently like this on a server.
+    """
+    lock = threading.RLock()
+    parse = ast.parse
+    get_bytecode = ScriptCache.get_bytecode
+
+    def locked_parse(*args, **kwargs):
+        with lock:
+            return parse(*args, **kwargs)
+
+    def locked_get_bytecode(self, script_path):
+        with lock:
+            return get_bytecode(self, script_path)
+
+    ast.parse = locked_parse
+    ScriptCache.get_bytecode = locked_get_bytecode
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.timings = {}
+        self.errors = {}
+        self.error_messages = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation, seconds, ok=True, error=None):
+        with self._lock:
+            if ok:
+                self.timings.setdefault(operation, []).append(seconds)
+            else:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+                self.error_messages.setdefault(operation, error)
+
+    def new_app(self, script):
+        return AppTest.from_file(os.path.join(ROOT, script), default_timeout=self.args.timeout)
+
+    def login(self, app):
+        app.run()
+        app.text_input(key="password").input(PASSWORD).run()
+
+    def timed_run(self, operation, app, done):
+        """Run the script until `done(app)` holds and record the elapsed time."""
+        started = time.perf_counter()
+        error = None
+        try:
+            app.run()
+            while not done(app) and not app.exception and time.perf_counter() - started < self.args.timeout:
+                app.run()
+            ok = done(app) and not app.exception
+            if app.exception:
+                error = app.exception[0].value
+            elif not ok:
+                error = "timed out"
+        except Exception as e:
+            ok = False
+            error = f"{type(e).__name__}: {e}"
+        self.record(operation, time.perf_counter() - started, ok, error)
+        return ok
+
+    def simulator_session(self, session_idx):
+        app = self.new_app("streamlit_app.py")
+        self.login(app)
+
+        app.text_input[0].input(f"{self.args.topic} #{session_idx}" if self.args.unique_topics else self.args.topic)
+        app.slider[0].set_value(self.args.rounds)
+        app.button(key="main_debate_button").click()
+        if not self.timed_run("debate_start", app, lambda a: a.session_state["debate_state"] is not None):
+            return
+
+        for question in random.sample(QUESTIONS, self.args.follow_ups):
+            asked = len(app.session_state["debate_state"]["user_questions"])
+            app.text_area[0].input(question)
+            next(button for button in app.button if button.label == "Submit Question").click()
+            self.timed_run("follow_up", app, lambda a: len(a.session_state["debate_state"]["user_questions"]) > asked)
+
+    def chatbot_session(self, session_idx):
+        app = self.new_app("app.py")
+        self.login(app)
+
+        for question in random.choices(QUESTIONS, k=self.args.queries):
+            answered = len(app.session_state["messages"]) + 2
+            app.chat_input[0].set_value(question)
+            self.timed_run("chat_query", app, lambda a: len(a.session_state["messages"]) >= answered)
+
+    def run_session(self, session):
+        """Run one session, recording a failure outside the timed operations as a session error."""
+        fn, idx = session
+        try:
+            fn(idx)
+        except Exception as e:
+            self.record("session", 0.0, ok=False, error=f"{type(e).__name__}: {e}")
+
+    def install_stand_ins(self):
+        """Import the app modules once and replace their SDK clients with stand-ins."""
+        share_app_test_globals()
+        serialize_ast_use()
+        for script in ("streamlit_app.py", "app.py"):
+            self.new_app(script).run()
+
+        import back_end
+        import main
+
+        args = self.args
+        llm = StandInChatModel(reply="A stand-in argument about the topic. " * 10,
+                               latency=args.llm_latency, jitter=args.jitter)
+        embeddings = StandInEmbeddings(latency=args.embed_latency, jitter=args.jitter)
+        store = LocalVectorStore(args.local_store, latency=args.search_latency, jitter=args.jitter)
+        if not args.local_store:
+            for debater in back_end.DEBATERS.values():
+                texts = [f"{random.choice(QUESTIONS)} Passage {i} for {debater['namespace']}." for i in range(50)]
+                store.upsert(debater['namespace'], [
+                    (f"{debater['namespace']}-{i}", vector, {'text': text, 'source': f"doc{i}.txt"})
+                    for i, (text, vector) in enumerate(zip(texts, embeddings.embed_documents(texts)))
+                ])
+
+        back_end.get_llm = lambda *a, **k: llm
+        back_end.get_embeddings = lambda *a, **k: embeddings
+        back_end.get_vectorstore = lambda namespace: store.as_namespace(namespace, embeddings)
+        main.GoogleGenerativeAIEmbeddings = lambda **k: embeddings
+        main.ChatGoogleGenerativeAI = lambda **k: llm
+        main.PineconeVectorStore = lambda index_name, embedding, namespace: store.as_namespace(namespace, embedding)
+        os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+        # Drop the resources cached by the first runs with the real clients
+        st.cache_resource.clear()
+
+    def run(self):
+        self.install_stand_ins()
+
+        sessions = []
+        for idx in range(self.args.sessions):
+            if self.args.app in ("simulator", "both"):
+                sessions.append((self.simulator_session, idx))
+            if self.args.app in ("chatbot", "both"):
+                sessions.append((self.chatbot_session, idx))
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency or len(sessions)) as pool:
+            list(pool.map(self.run_session, sessions))
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.report(elapsed, peak)
+
+    def report(self, elapsed, peak):
+        print(f"{len(self.timings) and sum(map(len, self.timings.values()))} operations in {elapsed:.1f}s")
+        print(f"{'operation':<14}{'count':>7}{'errors':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'ops/s':>9}")
+        for operation in ("debate_start", "follow_up", "chat_query", "session"):
+            values = self.timings.get(operation, [])
+            errors = self.errors.get(operation, 0)
+            if not values and not errors:
+                continue
+            p50, p95, p99 = np.percentile(values, [50, 95, 99]) if values else (float("nan"),) * 3
+            print(f"{operation:<14}{len(values):>7}{errors:>8}{p50:>8.2f}s{p95:>8.2f}s{p99:>8.2f}s"
+                  f"{len(values) / elapsed:>9.2f}")
+        for operation, message in self.error_messages.items():
+            print(f"First {operation} error: {message}")
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"Peak traced Python memory: {peak / 2**20:.1f} MiB, max RSS: {max_rss:.0f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", choices=["simulator", "chatbot", "both"], default="both")
+    parser.add_argument("--sessions", type=int, default=50, help="Simulated sessions per app")
+    parser.add_argument("--concurrency", type=int, default=0, help="Sessions run at once, 0 for all")
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--follow-ups", type=int, default=1)
+    parser.add_argument("--queries", type=int, default=3, help="Chatbot queries per session")
+    parser.add_argument("--topic", default="The future of artificial intelligence")
+    parser.add_argument("--unique-topics", action="store_true", help="Give every session its own topic")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Median stand-in LLM latency in seconds")
+    parser.add_argument("--embed-latency", type=float, default=0.1)
+    parser.add_argument("--search-latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.3, help="Log-normal sigma applied to every latency")
+    parser.add_argument("--local-store", help="Use a local vector store file from ingest.py instead of synthetic data")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    LoadTest(args).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Benchmark debate prompt assembly and prefix reuse.
+
+Compares the previous string concatenation prompt with the structured layout
+from `prompt_builder`, running a simulated debate against a stand-in model.
+
+    python -m benchmarks.prompt_assembly --debaters 4 --rounds 5
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompt import debater_prompts
+from prompt_builder import (CHARS_PER_TOKEN, InMemoryPrefixCache, build_debater_prefix,
+                            build_turn_messages, prefix_key)
+from stand_ins import StandInChatModel, message_text
+
+TOPIC = "The future of artificial intelligence"
+DESCRIPTION = "Tech leader known for their views on AI"
+
+
+def legacy_prompt(debater_name, state, knowledge):
+    """The single f-string prompt with `+=` concatenation used before the prompt builder."""
+    knowledge_context = ""
+    for i, item in enumerate(knowledge):
+        knowledge_context += f"{i+1}. {item['content']}"
+    character_prompt = debater_prompts.get(debater_name, "")
+    prompt = f"""
+        You are {debater_name}, participating in a debate on the topic: "{state['topic']}".
+
+        This is round {state['current_round']} of {state['max_rounds']}.
+
+        Character guidance for {debater_name}:
+        {character_prompt}
+        - {DESCRIPTION}
+        - Use the speaking style, mannerisms, and viewpoints that {debater_name} is known for
+        - Reference relevant companies, projects, or initiatives that {debater_name} is associated with
+        - Make arguments that align with {debater_name}'s known positions
+        - limit your response to 1-2 paragraphs maximum and within 100 words.
+        {knowledge_context}
+
+        Previous exchanges in this round:
+        """
+    if state['current_round'] <= len(state['history']):
+        for debater in state['debaters']:
+            if debater in state['history'][state['current_round'] - 1]:
+                prompt += f"{debater}: {state['history'][state['current_round'] - 1][debater]}"
+    if state['current_round'] > 1:
+        prompt += "Previous rounds:"
+        for round_idx in range(state['current_round'] - 1):
+            if round_idx < len(state['history']):
+                prompt += f"Round {round_idx + 1}:"
+                for debater in state['debaters']:
+                    if debater in state['history'][round_idx]:
+                        prompt += f"{debater}: {state['history'][round_idx][debater]}"
+    prompt += f"Now, as {debater_name}, provide your argument for this round."
+    return prompt
+
+
+def structured_prompt(debater_name, state, knowledge, prefixes):
+    """The structured layout, building the static prefix once per debater."""
+    if debater_name not in prefixes:
+        prefixes[debater_name] = build_debater_prefix(
+            debater_name, state['topic'], DESCRIPTION, debater_prompts.get(debater_name, ""), knowledge
+        )
+    return build_turn_messages(
+        prefixes[debater_name], debater_name, state['debaters'],
+        state['current_round'], state['max_rounds'], state['history']
+    )
+
+
+def common_prefix_length(a, b):
+    """Return the length of the common prefix of two strings."""
+    return len(os.path.commonprefix([a, b]))
+
+
+def run_debate(debaters, rounds, knowledge, reply, build):
+    """Run a simulated debate and collect every prompt sent to the stand-in model."""
+    model = StandInChatModel(reply=reply)
+    state = {
+        'topic': TOPIC,
+        'debaters': debaters,
+        'current_round': 1,
+        'max_rounds': rounds,
+        'history': [{}],
+    }
+    prompts = []
+    for round_num in range(1, rounds + 1):
+        state['current_round'] = round_num
+        if round_num > len(state['history']):
+            state['history'].append({})
+        for debater in debaters:
+            prompt = build(debater, state, knowledge)
+            prompts.append((debater, prompt))
+            state['history'][round_num - 1][debater] = model.invoke(prompt).content
+    return prompts
+
+
+def reuse_stats(prompts):
+    """Return total prompt characters and characters shared with the debater's previous prompt."""
+    previous = {}
+    total = reused = 0
+    for debater, prompt in prompts:
+        text = message_text(prompt)
+        total += len(text)
+        if debater in previous:
+            reused += common_prefix_length(previous[debater], text)
+        previous[debater] = text
+    return total, reused
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--debaters", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--chunks", type=int, default=5, help="Knowledge chunks per debater")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    debaters = list(debater_prompts)[:args.debaters]
+    knowledge = [{'content': "Knowledge chunk about AI. " * 25, 'source': f"doc{i}"} for i in range(args.chunks)]
+    reply = "A stand-in argument about the topic. " * 15
+
+    legacy_build = legacy_prompt
+    legacy_time = timeit.timeit(
+        lambda: run_debate(debaters, args.rounds, knowledge, reply, legacy_build), number=args.repeat
+    )
+
+    def structured_build_factory():
+        prefixes = {}
+        return lambda debater, state, chunks: structured_prompt(debater, state, chunks, prefixes)
+
+    structured_time = timeit.timeit(
+        lambda: run_debate(debaters, args.rounds, knowledge, reply, structured_build_factory()), number=args.repeat
+    )
+
+    turns = args.debaters * args.rounds
+    print(f"Debate: {args.debaters} debaters x {args.rounds} rounds = {turns} turns")
+    print(f"Assembly per turn (legacy):     {legacy_time / (args.repeat * turns) * 1e6:8.1f} us")
+    print(f"Assembly per turn (structured): {structured_time / (args.repeat * turns) * 1e6:8.1f} us")
+
+    prefix_cache = InMemoryPrefixCache()
+    structured_prompts = run_debate(debaters, args.rounds, knowledge, reply, structured_build_factory())
+    for debater, messages in structured_prompts:
+        prefix_cache.attach(prefix_key(debater, messages[0]['content']), messages[0]['content'])
+
+    for name, prompts in [("legacy", run_debate(debaters, args.rounds, knowledge, reply, legacy_build)),
+                          ("structured", structured_prompts)]:
+        total, reused = reuse_stats(prompts)
+        print(f"Prefix reuse ({name}): {reused // CHARS_PER_TOKEN} of {total // CHARS_PER_TOKEN} "
+              f"prompt tokens ({reused / total:.0%})")
+
+    print(f"Prefix cache: {prefix_cache.hits} hits, {prefix_cache.misses} misses, "
+          f"{prefix_cache.reused_chars // CHARS_PER_TOKEN} tokens reusable")
+
+
+if __name__ == "__main__":
+    main()
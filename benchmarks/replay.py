@@ -0,0 +1,76 @@
+"""
+Rerun the requests recorded in a cassette as a repeatable performance test.
+
+Every debate, follow-up and chatbot question noted in the cassette is run again
+with its Gemini and Pinecone calls served from the cassette, offline. With
+--playback each call also takes as long as it did when it was recorded.
+
+    python -m benchmarks.replay traces/slow-debate.jsonl.gz --repeat 5 --playback
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cassette import CASSETTE_ENV, CASSETTE_MODE_ENV, CASSETTE_PLAYBACK_ENV, REPLAY
+
+
+def replay_notes(notes, timings):
+    """Run the noted requests in order, adding each one's duration to `timings`."""
+    from back_end import generate_debate, handle_follow_up_question
+    from main import GroupDebateQA
+
+    state = None
+    qa_engine = GroupDebateQA()
+    for note in notes:
+        started = time.perf_counter()
+        if note['name'] == "debate":
+            state = generate_debate(note['topic'], note['debaters'], note['num_rounds'],
+                                    convergence_threshold=note['convergence_threshold'],
+                                    token_budget=note['token_budget'])
+        elif note['name'] == "follow_up" and state is not None:
+            state = handle_follow_up_question(state, note['question'], note['responders'])
+        elif note['name'] == "chat":
+            qa_engine.answer_question(note['query'], note['debater_name'], k=note['k'])
+        else:
+            continue
+        timings.setdefault(note['name'], []).append(time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cassette", help="Cassette recorded with GROUPDEBATE_CASSETTE_MODE=record")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--playback", action="store_true", help="Sleep for each call's recorded latency")
+    args = parser.parse_args()
+
+    # The cassette is configured before the app modules are imported
+    os.environ[CASSETTE_ENV] = args.cassette
+    os.environ[CASSETTE_MODE_ENV] = REPLAY
+    os.environ[CASSETTE_PLAYBACK_ENV] = "1" if args.playback else ""
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    from back_end import CASSETTE
+    from metrics import METRICS
+
+    print(f"{len(CASSETTE.notes)} recorded requests: "
+          f"{', '.join(sorted({note['name'] for note in CASSETTE.notes}))}")
+    timings = {}
+    for _ in range(args.repeat):
+        CASSETTE.rewind()
+        replay_notes(CASSETTE.notes, timings)
+
+    print(f"{'request':<12}{'count':>7}{'p50':>9}{'min':>9}{'max':>9}")
+    for name, values in timings.items():
+        p50 = np.percentile(values, 50)
+        print(f"{name:<12}{len(values):>7}{p50:>8.3f}s{min(values):>8.3f}s{max(values):>8.3f}s")
+    print(f"Replayed calls: {METRICS.get('cassette_replays_total')}, "
+          f"misses: {METRICS.get('cassette_misses_total')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import METRICS
+from usage import extract_usage
+
+# Threads running calls that can be abandoned when their work is cancelled
+MAX_CANCELLABLE_CALLS = 32
+_CALL_POOL = ThreadPoolExecutor(max_workers=MAX_CANCELLABLE_CALLS, thread_name_prefix="cancellable")
+
+
+class Cancelled(BaseException):
+    """
+    Raised in work whose cancellation token was cancelled.
+
+    Like `asyncio.CancelledError` it derives from BaseException, so the
+    `except Exception` fallbacks around LLM and retrieval calls let it through.
+    """
+
+
+class CancellationToken:
+    """Cooperative cancellation shared by all the work done for one debate or follow-up."""
+
+    def __init__(self):
+        self.reason = None
+        self._event = threading.Event()
+        self._waiters = set()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason="cancelled"):
+        """Cancel the work and wake every call waiting on this token."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            waiters = list(self._waiters)
+        for waiter in waiters:
+            waiter.set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+    def run(self, call_type, fn, *args, **kwargs):
+        """
+        Run a blocking call, returning early with `Cancelled` if the token is cancelled.
+
+        The call runs on a worker thread. A call abandoned this way cannot be
+        interrupted, so it finishes in the background; its result is dropped and
+        its tokens, if it was an LLM call, are counted as wasted.
+
+        Args:
+            call_type (str): Label for the metrics, e.g. "debate_turn" or "retrieval"
+            fn (callable): Blocking call to run
+        """
+        self.raise_if_cancelled()
+        finished = threading.Event()
+        future = _CALL_POOL.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda _: finished.set())
+
+        with self._lock:
+            self._waiters.add(finished)
+        if self._event.is_set():
+            finished.set()
+        try:
+            finished.wait()
+        finally:
+            with self._lock:
+                self._waiters.discard(finished)
+
+        if future.done():
+            return future.result()
+
+        METRICS.inc("cancelled_calls_total", call_type=call_type)
+        future.add_done_callback(lambda done: count_abandoned(done, call_type))
+        raise Cancelled(self.reason)
+
+
+def run_cancellable(cancel_token, call_type, fn, *args, **kwargs):
+    """Run `fn` through a cancellation token, or directly if there is none."""
+    if cancel_token is None:
+        return fn(*args, **kwargs)
+    return cancel_token.run(call_type, fn, *args, **kwargs)
+
+
+def raise_if_cancelled(cancel_token):
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+
+
+def count_wasted_tokens(tokens, call_type):
+    """Count tokens spent on work whose result was thrown away."""
+    if tokens:
+        METRICS.inc("wasted_tokens_total", tokens, call_type=call_type)
+
+
+def count_abandoned(future, call_type):
+    """Count the tokens of an abandoned call once it finishes."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    result = future.result()
+    # The router returns (response, model name)
+    response = result[0] if isinstance(result, tuple) else result
+    count_wasted_tokens(extract_usage(response)['total_tokens'], call_type)
@@ -0,0 +1,270 @@
+"""
+Record and replay the traffic to Gemini and Pinecone.
+
+In record mode every LLM call, embedding call and similarity search made by
+the apps is captured with its latency into a gzip-compressed JSONL cassette.
+In replay mode the same calls are served from the cassette without any network
+access, optionally sleeping for the recorded latency, so a production trace
+can be rerun locally as a repeatable performance test.
+
+Configured with environment variables:
+
+    GROUPDEBATE_CASSETTE=traces/slow-debate.jsonl.gz
+    GROUPDEBATE_CASSETTE_MODE=record          # or "replay"
+    GROUPDEBATE_CASSETTE_PLAYBACK=1           # replay with recorded latency
+"""
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+
+from metrics import METRICS
+
+CASSETTE_ENV = "GROUPDEBATE_CASSETTE"
+CASSETTE_MODE_ENV = "GROUPDEBATE_CASSETTE_MODE"
+CASSETTE_PLAYBACK_ENV = "GROUPDEBATE_CASSETTE_PLAYBACK"
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+
+# Recorded entries are written to disk in batches of this size
+FLUSH_EVERY = 50
+
+# Vector components are rounded before hashing so replayed embeddings match
+VECTOR_DECIMALS = 6
+
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode when a call was not recorded."""
+
+
+def request_key(kind, payload):
+    """Return the lookup key of a call from its kind and request payload."""
+    data = json.dumps([kind, payload], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:24]
+
+
+def serialize_messages(messages):
+    """Convert a prompt string or messages to plain JSON data."""
+    if isinstance(messages, str):
+        return messages
+    return [message if isinstance(message, dict) else {'role': message.type, 'content': message.content}
+            for message in messages]
+
+
+def round_vector(vector):
+    return [round(float(value), VECTOR_DECIMALS) for value in vector]
+
+
+class Cassette:
+    def __init__(self, path=None, mode=OFF, playback=False):
+        """
+        Record calls to a cassette file or replay them from it.
+
+        Args:
+            path (str): Cassette file, gzip-compressed JSON lines
+            mode (str): "off", "record" or "replay"
+            playback (bool): In replay mode, sleep for each call's recorded latency
+        """
+        self.path = path
+        self.mode = mode if path else OFF
+        self.playback = playback
+        self.notes = []
+        self._pending = []
+        self._recorded = {}
+        self._lock = threading.Lock()
+
+        if self.mode == REPLAY:
+            self._load()
+        elif self.mode == RECORD:
+            atexit.register(self.flush)
+
+    @classmethod
+    def from_env(cls):
+        """Create the cassette configured by the environment, off by default."""
+        return cls(
+            os.environ.get(CASSETTE_ENV),
+            os.environ.get(CASSETTE_MODE_ENV, OFF),
+            os.environ.get(CASSETTE_PLAYBACK_ENV, "") not in ("", "0", "false")
+        )
+
+    @property
+    def recording(self):
+        return self.mode == RECORD
+
+    @property
+    def replaying(self):
+        return self.mode == REPLAY
+
+    def _load(self):
+        recorded = {}
+        notes = []
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry['kind'] == "note":
+                    notes.append(entry['response'])
+                else:
+                    recorded.setdefault(entry['key'], deque()).append(entry)
+        with self._lock:
+            self._recorded = recorded
+            self.notes = notes
+
+    def rewind(self):
+        """Reload the cassette so a replay can start over."""
+        self._load()
+
+    def note(self, name, **details):
+        """Record what the app was asked to do, so a replay can repeat the same requests."""
+        if self.recording:
+            self.record("note", None, 0.0, {'name': name, **details})
+
+    def record(self, kind, key, seconds, response):
+        """Add a call to the cassette, writing a batch to disk when it is full."""
+        entry = {'kind': kind, 'key': key, 'seconds': round(seconds, 4), 'response': response}
+        with self._lock:
+            self._pending.append(entry)
+            full = len(self._pending) >= FLUSH_EVERY
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Append recorded entries to the cassette file."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                for entry in pending:
+                    f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def replay(self, kind, key):
+        """
+        Return the recorded response of a call.
+
+        Identical calls are served in recorded order; once they run out the
+        last response is repeated.
+        """
+        with self._lock:
+            entries = self._recorded.get(key)
+            if not entries:
+                METRICS.inc("cassette_misses_total", kind=kind)
+                raise CassetteMiss(f"No recorded {kind} call with key {key}")
+            entry = entries.popleft() if len(entries) > 1 else entries[0]
+        METRICS.inc("cassette_replays_total", kind=kind)
+        if self.playback:
+            time.sleep(entry['seconds'])
+        return entry['response']
+
+    def call(self, kind, payload, fn, serialize, deserialize):
+        """Record or replay one call."""
+        key = request_key(kind, payload)
+        if self.replaying:
+            return deserialize(self.replay(kind, key))
+        started = time.perf_counter()
+        result = fn()
+        self.record(kind, key, time.perf_counter() - started, serialize(result))
+        return result
+
+    def chat_model(self, model_name, factory):
+        """Return a chat model from `factory`, wrapped for recording or replay if enabled."""
+        if self.mode == OFF:
+            return factory()
+        return CassetteChatModel(self, model_name, None if self.replaying else factory())
+
+    def embeddings(self, factory):
+        """Return an embeddings model from `factory`, wrapped for recording or replay if enabled."""
+        if self.mode == OFF:
+            return factory()
+        return CassetteEmbeddings(self, None if self.replaying else factory())
+
+    def vectorstore(self, namespace, factory):
+        """Return a vector store from `factory`, wrapped for recording or replay if enabled."""
+        if self.mode == OFF:
+            return factory()
+        return CassetteVectorStore(self, namespace, None if self.replaying else factory())
+
+
+class CassetteChatModel:
+    """Chat model that records or replays `invoke` calls."""
+
+    def __init__(self, cassette, model_name, model=None):
+        self.cassette = cassette
+        self.model_name = model_name
+        self.model = model
+
+    def invoke(self, messages, **kwargs):
+        # The model is not part of the key, so replay does not depend on routing decisions
+        return self.cassette.call(
+            "llm",
+            serialize_messages(messages),
+            lambda: self.model.invoke(messages, **kwargs),
+            lambda response: {
+                'model': self.model_name,
+                'content': response.content,
+                'usage_metadata': getattr(response, "usage_metadata", None)
+            },
+            lambda data: AIMessage(content=data['content'], usage_metadata=data['usage_metadata'])
+        )
+
+
+class CassetteEmbeddings(Embeddings):
+    """Embeddings model that records or replays embedding calls."""
+
+    def __init__(self, cassette, embeddings=None):
+        self.cassette = cassette
+        self.embeddings = embeddings
+
+    def embed_query(self, text):
+        return self.cassette.call("embed_query", text, lambda: self.embeddings.embed_query(text),
+                                  round_vector, list)
+
+    def embed_documents(self, texts):
+        return self.cassette.call(
+            "embed_documents",
+            list(texts),
+            lambda: self.embeddings.embed_documents(texts),
+            lambda vectors: [round_vector(vector) for vector in vectors],
+            list
+        )
+
+
+class CassetteVectorStore:
+    """Vector store that records or replays similarity searches in one namespace."""
+
+    def __init__(self, cassette, namespace, store=None):
+        self.cassette = cassette
+        self.namespace = namespace
+        self.store = store
+
+    def __getattr__(self, name):
+        # Everything else, such as `index` for ingestion, goes to the real store
+        if self.store is None:
+            raise AttributeError(f"{name} is not available while replaying a cassette")
+        return getattr(self.store, name)
+
+    def _search(self, kind, query, k, fn):
+        return self.cassette.call(
+            kind,
+            [self.namespace, query, k],
+            fn,
+            lambda docs: [[doc.page_content, doc.metadata] for doc in docs],
+            lambda data: [Document(page_content=content, metadata=metadata) for content, metadata in data]
+        )
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return self._search("search", query, k, lambda: self.store.similarity_search(query, k=k, **kwargs))
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return self._search("search_by_vector", round_vector(embedding), k,
+                            lambda: self.store.similarity_search_by_vector(embedding, k=k, **kwargs))
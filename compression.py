@@ -0,0 +1,105 @@
+import re
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache, normalize
+
+# Default compression settings
+DEFAULT_MAX_CHARS = 2400
+DEFAULT_MIN_SENTENCE_CHARS = 20
+DEFAULT_CACHE_SIZE = 4096
+
+# Sentence boundaries: terminal punctuation or a blank line
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+def split_sentences(text, min_chars=DEFAULT_MIN_SENTENCE_CHARS):
+    """Split a chunk into sentences, merging fragments shorter than `min_chars` into the next one."""
+    sentences = []
+    pending = ""
+    for part in SENTENCE_SPLIT.split(text):
+        part = " ".join(part.split())
+        if not part:
+            continue
+        pending = f"{pending} {part}" if pending else part
+        if len(pending) >= min_chars:
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        if sentences:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
+
+
+class ExtractiveCompressor:
+    def __init__(self, embeddings, max_chars=DEFAULT_MAX_CHARS, min_sentence_chars=DEFAULT_MIN_SENTENCE_CHARS,
+                 cache_size=DEFAULT_CACHE_SIZE):
+        """
+        Keep only the sentences of retrieved chunks that are relevant to a query.
+
+        Chunks are split into sentences, the sentences are embedded in one batch
+        and scored against the query embedding with a single matrix-vector
+        product. The best sentences are kept until `max_chars` is reached, then
+        put back in their original order under the source they came from.
+        Sentence embeddings are cached, so the same debate knowledge is embedded
+        once across turns and follow-ups.
+
+        Args:
+            embeddings: Embeddings model with an `embed_documents` method
+            max_chars (int): Character budget for the kept sentences
+            min_sentence_chars (int): Shorter fragments are merged with the next sentence
+            cache_size (int): Maximum cached sentence embeddings
+        """
+        self.embeddings = embeddings
+        self.max_chars = max_chars
+        self.min_sentence_chars = min_sentence_chars
+        self.cache_size = cache_size
+        self.sentence_vectors = EmbeddingCache(embeddings, max_entries=cache_size)
+
+    def compress(self, query_vector, chunks):
+        """
+        Compress retrieved chunks to the sentences most similar to a query.
+
+        Args:
+            query_vector (list): Embedding of the topic or question
+            chunks (list): Dicts with 'content' and 'source'
+
+        Returns:
+            list: Dicts with the kept 'content' and its 'source', in the original
+            chunk order; chunks with no kept sentence are dropped. At least the
+            best sentence is kept, cut to `max_chars` if it is longer
+        """
+        sentences = []
+        for chunk_idx, chunk in enumerate(chunks):
+            for sentence in split_sentences(chunk['content'], self.min_sentence_chars):
+                sentences.append((chunk_idx, sentence))
+        if not sentences or sum(len(sentence) for _, sentence in sentences) <= self.max_chars:
+            return [{'content': chunk['content'], 'source': chunk.get('source', "Unknown")} for chunk in chunks]
+
+        scores = self.sentence_vectors.embed([sentence for _, sentence in sentences]) @ normalize(query_vector)
+
+        kept = set()
+        used = 0
+        ranked = np.argsort(-scores)
+        for idx in ranked:
+            length = len(sentences[idx][1])
+            if used + length > self.max_chars:
+                continue
+            kept.add(int(idx))
+            used += length
+
+        # Unpunctuated transcripts can have no sentence short enough, so the best one is cut to fit
+        if not kept:
+            best = int(ranked[0])
+            sentences[best] = (sentences[best][0], sentences[best][1][:self.max_chars])
+            kept.add(best)
+
+        compressed = []
+        for chunk_idx, chunk in enumerate(chunks):
+            chunk_sentences = [sentence for idx, (owner, sentence) in enumerate(sentences)
+                               if owner == chunk_idx and idx in kept]
+            if chunk_sentences:
+                compressed.append({'content': " ".join(chunk_sentences), 'source': chunk.get('source', "Unknown")})
+        return compressed
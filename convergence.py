@@ -0,0 +1,64 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+# Default convergence settings
+DEFAULT_NOVELTY_THRESHOLD = 0.15
+DEFAULT_MIN_ROUNDS = 2
+
+
+class ConvergenceDetector:
+    def __init__(self, embeddings, threshold=DEFAULT_NOVELTY_THRESHOLD, min_rounds=DEFAULT_MIN_ROUNDS):
+        """
+        Detect when a debate has stopped producing new arguments.
+
+        The novelty of a turn is one minus its highest cosine similarity to the
+        same debater's earlier turns. A round converges when every debater's
+        novelty is below the threshold. Turn embeddings are cached, so each turn
+        is embedded once per debate.
+
+        Args:
+            embeddings: Embeddings model with an `embed_documents` method
+            threshold (float): Novelty below which a debater is repeating themselves
+            min_rounds (int): Rounds that always run before the debate can stop
+        """
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.min_rounds = min_rounds
+        self.turn_vectors = EmbeddingCache(embeddings)
+
+    def round_novelty(self, debaters, history, round_num):
+        """
+        Return each debater's novelty for a completed round.
+
+        Args:
+            debaters (list): Debaters in speaking order
+            history (list): Debate history, one dict per round
+            round_num (int): Completed round to score, starting at 1
+
+        Returns:
+            dict: Debater name -> novelty between 0 and 2
+        """
+        novelty = {}
+        for debater in debaters:
+            turns = [history[idx][debater] for idx in range(round_num) if history[idx].get(debater)]
+            if len(turns) < 2:
+                continue
+            vectors = self.turn_vectors.embed(turns)
+            latest, earlier = vectors[-1], vectors[:-1]
+            novelty[debater] = float(1.0 - np.max(earlier @ latest))
+        return novelty
+
+    def converged(self, debaters, history, round_num):
+        """
+        Return whether a completed round added nothing new, and the per-debater novelty.
+
+        Returns:
+            tuple: (converged, novelty by debater)
+        """
+        if round_num < self.min_rounds:
+            return False, {}
+        novelty = self.round_novelty(debaters, history, round_num)
+        if not novelty or len(novelty) < len(debaters):
+            return False, novelty
+        return all(value < self.threshold for value in novelty.values()), novelty
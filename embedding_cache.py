@@ -0,0 +1,61 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize(vectors):
+    """
+    Scale a vector, or each row of a matrix, to unit length.
+
+    Returns a new float32 array; zero vectors stay zero.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def text_key(text):
+    """Return the cache key of a text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, embeddings, max_entries=None):
+        """
+        Embed texts once, keeping their normalized embeddings by content hash.
+
+        Uncached texts are embedded in one `embed_documents` batch. Once
+        `max_entries` is reached the least recently used embedding is dropped.
+
+        Args:
+            embeddings: Embeddings model with an `embed_documents` method
+            max_entries (int): Maximum cached embeddings, None for unlimited
+        """
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def embed(self, texts):
+        """Return the normalized embeddings of the texts as the rows of a float32 matrix."""
+        keys = [text_key(text) for text in texts]
+        vectors = {}
+        with self._lock:
+            for key in keys:
+                if key in self._vectors:
+                    self._vectors.move_to_end(key)
+                    vectors[key] = self._vectors[key]
+
+        missing = list({key: text for key, text in zip(keys, texts) if key not in vectors}.items())
+        if missing:
+            embedded = normalize(self.embeddings.embed_documents([text for _, text in missing]))
+            with self._lock:
+                for (key, _), vector in zip(missing, embedded):
+                    vectors[key] = self._vectors[key] = vector
+                while self.max_entries is not None and len(self._vectors) > self.max_entries:
+                    self._vectors.popitem(last=False)
+        return np.stack([vectors[key] for key in keys])
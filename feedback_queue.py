@@ -0,0 +1,143 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+# Default batching settings
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_SPOOL_PATH = "feedback_spool.jsonl"
+
+
+class LocalSheet:
+    """Local stand-in for a gspread worksheet, optionally backed by a JSON lines file."""
+
+    def __init__(self, path=None, fail=False):
+        self.path = path
+        self.fail = fail
+        self.rows = []
+
+    def append_rows(self, rows):
+        if self.fail:
+            raise ConnectionError("Local sheet is unreachable")
+        self.rows.extend(rows)
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row) + "\n")
+
+
+class FeedbackQueue:
+    def __init__(self, sheet_factory, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, spool_path=DEFAULT_SPOOL_PATH):
+        """
+        Collect feedback rows and append them to a sheet from a background thread.
+
+        Rows are flushed with a single `append_rows` call once `batch_size` rows
+        are pending or `flush_interval` seconds have passed since the first one.
+        Rows that cannot be written are spooled to `spool_path` and retried on
+        the next successful flush.
+
+        Args:
+            sheet_factory (callable): Returns a worksheet with an `append_rows` method
+            batch_size (int): Number of rows that triggers a flush
+            flush_interval (float): Maximum seconds a row waits before a flush
+            spool_path (str): Local file for rows that could not be written
+        """
+        self.sheet_factory = sheet_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+
+        self._sheet = None
+        self._queue = queue.Queue()
+        self._spool_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        self._worker = threading.Thread(target=self._run, name="feedback-queue", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def submit(self, feedback_text):
+        """Queue a feedback entry without waiting for the sheet."""
+        if self._stopped.is_set():
+            raise RuntimeError("Feedback queue is closed")
+        self._queue.put([feedback_text])
+
+    def close(self, timeout=10.0):
+        """Flush pending rows and stop the worker thread."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._queue.put(None)
+        self._worker.join(timeout)
+
+    def pending_spooled(self):
+        """Return the number of rows waiting in the local spool."""
+        with self._spool_lock:
+            return len(self._read_spool())
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                batch.append(row)
+
+            self._flush(batch)
+            if stop:
+                return
+
+    def _get_sheet(self):
+        if self._sheet is None:
+            self._sheet = self.sheet_factory()
+        return self._sheet
+
+    def _flush(self, batch):
+        """Write spooled rows and the new batch, spooling everything on failure."""
+        with self._spool_lock:
+            rows = self._read_spool() + batch
+            try:
+                self._get_sheet().append_rows(rows)
+            except Exception:
+                # Drop the cached sheet so the next flush reconnects
+                self._sheet = None
+                self._write_spool(rows)
+            else:
+                self._write_spool([])
+
+    def _read_spool(self):
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return []
+        with open(self.spool_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _write_spool(self, rows):
+        if not self.spool_path:
+            return
+        if not rows:
+            if os.path.exists(self.spool_path):
+                os.remove(self.spool_path)
+            return
+        tmp_path = f"{self.spool_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        os.replace(tmp_path, self.spool_path)
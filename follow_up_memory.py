@@ -0,0 +1,113 @@
+from embedding_cache import normalize
+from metrics import METRICS
+
+# Default memory settings
+DEFAULT_MAX_RELEVANT = 3
+DEFAULT_OWN_RECENT = 2
+DEFAULT_MAX_CHARS = 3000
+
+
+def exchange_chars(exchange):
+    return len(exchange['question']) + sum(len(resp['response']) for resp in exchange['responses'])
+
+
+class FollowUpMemory:
+    def __init__(self, embeddings, max_relevant=DEFAULT_MAX_RELEVANT, own_recent=DEFAULT_OWN_RECENT,
+                 max_chars=DEFAULT_MAX_CHARS):
+        """
+        Pick the earlier follow-up exchanges worth repeating in a new follow-up prompt.
+
+        The embedding of every follow-up question is kept in the state next to
+        `user_questions`. For a new question and responder, the earlier
+        questions most similar to it are selected with all their responses,
+        together with the responder's own most recent answers, until
+        `max_chars` is reached. Prompt size therefore stays flat however long
+        the follow-up session runs.
+
+        Args:
+            embeddings: Embeddings model with an `embed_documents` method
+            max_relevant (int): Most similar earlier exchanges to include
+            own_recent (int): The responder's most recent answers to include
+            max_chars (int): Character budget for the included exchanges
+        """
+        self.embeddings = embeddings
+        self.max_relevant = max_relevant
+        self.own_recent = own_recent
+        self.max_chars = max_chars
+
+    def vectors(self, state):
+        """
+        Return the normalized question embeddings aligned with `user_questions`.
+
+        Questions without an embedding, such as those of an archived debate,
+        are embedded in one batch; if that fails they stay None.
+        """
+        questions = state.get('user_questions', [])
+        vectors = state.setdefault('follow_up_vectors', [])
+        vectors.extend([None] * (len(questions) - len(vectors)))
+
+        missing = [idx for idx, vector in enumerate(vectors) if vector is None]
+        if missing:
+            try:
+                embedded = self.embeddings.embed_documents([questions[idx]['question'] for idx in missing])
+            except Exception:
+                embedded = [None] * len(missing)
+            for idx, vector in zip(missing, embedded):
+                vectors[idx] = None if vector is None else normalize(vector)
+        return vectors
+
+    def remember(self, state, question_entry, question_vector=None):
+        """Add an answered question to the state with its embedding."""
+        vectors = state.setdefault('follow_up_vectors', [])
+        vectors.extend([None] * (len(state['user_questions']) - len(vectors)))
+        state['user_questions'].append(question_entry)
+        vectors.append(None if question_vector is None else normalize(question_vector))
+
+    def select(self, state, responder_name, question_vector=None):
+        """
+        Return the earlier exchanges to include in a responder's prompt.
+
+        Args:
+            state (dict): Debate state with `user_questions`
+            responder_name (str): Debater answering the new question
+            question_vector (list): Embedding of the new question; without it
+                the most recent exchanges count as the most relevant
+
+        Returns:
+            list: Exchanges (dicts with 'question' and 'responses') in the
+            order they were asked; the responder's own recent answers that
+            are not among the most similar come without the other responses
+        """
+        questions = state.get('user_questions', [])
+        if not questions:
+            return []
+
+        # The most similar exchanges, then the responder's own recent answers
+        if question_vector is None:
+            ranked = list(range(len(questions)))[::-1]
+        else:
+            query = normalize(question_vector)
+            scored = [(float(vector @ query), idx) for idx, vector in enumerate(self.vectors(state))
+                      if vector is not None]
+            ranked = [idx for _, idx in sorted(scored, reverse=True)]
+        relevant = ranked[:self.max_relevant]
+        own = [idx for idx, q_data in enumerate(questions)
+               if idx not in relevant and any(resp['responder'] == responder_name for resp in q_data['responses'])]
+        own = own[-self.own_recent:] if self.own_recent else []
+
+        selected = {}
+        used = 0
+        for idx in relevant + own:
+            q_data = questions[idx]
+            if idx in own:
+                q_data = {**q_data, 'responses': [resp for resp in q_data['responses']
+                                                  if resp['responder'] == responder_name]}
+            length = exchange_chars(q_data)
+            if used + length > self.max_chars:
+                continue
+            selected[idx] = q_data
+            used += length
+
+        METRICS.inc("follow_up_memory_exchanges_total", len(selected), outcome="included")
+        METRICS.inc("follow_up_memory_exchanges_total", len(questions) - len(selected), outcome="left_out")
+        return [selected[idx] for idx in sorted(selected)]
@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from cancellation import count_abandoned
+from metrics import METRICS
+
+# Default hedging settings
+DEFAULT_PERCENTILE = 95
+DEFAULT_MAX_HEDGE_RATE = 0.1
+DEFAULT_WINDOW = 200
+DEFAULT_MIN_SAMPLES = 20
+DEFAULT_MIN_DELAY = 0.5
+DEFAULT_MAX_WORKERS = 16
+
+
+class LatencyTracker:
+    """Rolling window of call latencies with a percentile threshold."""
+
+    def __init__(self, window=DEFAULT_WINDOW, min_samples=DEFAULT_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q):
+        """Return the q-th percentile latency, or None until `min_samples` calls are seen."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            return float(np.percentile(self._samples, q))
+
+
+class Hedger:
+    def __init__(self, enabled=False, percentile=DEFAULT_PERCENTILE, max_hedge_rate=DEFAULT_MAX_HEDGE_RATE,
+                 window=DEFAULT_WINDOW, min_samples=DEFAULT_MIN_SAMPLES, min_delay=DEFAULT_MIN_DELAY,
+                 max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Issue a duplicate LLM request when the first one is slower than usual.
+
+        Latencies are tracked per call type. Once a call has run longer than the
+        rolling percentile for its type, an identical request is sent and
+        whichever finishes first is returned. The loser is cancelled if it has
+        not started and otherwise left to finish with its result discarded; its
+        tokens are then counted in `wasted_tokens_total`.
+        At most `max_hedge_rate` of the calls in the window are hedged.
+
+        Args:
+            enabled (bool): Hedge calls; when False `invoke` calls the model directly
+            percentile (float): Latency percentile after which a call is hedged
+            max_hedge_rate (float): Maximum fraction of recent calls that may be hedged
+            window (int): Calls kept per call type for the percentile and rate cap
+            min_samples (int): Calls of a type seen before it can be hedged
+            min_delay (float): Minimum seconds to wait before hedging
+            max_workers (int): Threads running in-flight requests
+        """
+        self.enabled = enabled
+        self.percentile = percentile
+        self.max_hedge_rate = max_hedge_rate
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_workers = max_workers
+        self._trackers = {}
+        self._hedged = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _tracker(self, call_type):
+        with self._lock:
+            if call_type not in self._trackers:
+                self._trackers[call_type] = LatencyTracker(self.window, self.min_samples)
+                self._hedged[call_type] = deque(maxlen=self.window)
+            return self._trackers[call_type]
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hedge")
+            return self._executor
+
+    def _allow_hedge(self, call_type):
+        """Return whether hedging another call keeps the hedge rate under the cap."""
+        with self._lock:
+            recent = self._hedged[call_type]
+            return sum(recent) + 1 <= self.max_hedge_rate * max(len(recent), self.min_samples)
+
+    def _mark(self, call_type, hedged):
+        with self._lock:
+            self._hedged[call_type].append(hedged)
+
+    def threshold(self, call_type):
+        """Return the seconds after which a call of this type is hedged, or None."""
+        value = self._tracker(call_type).percentile(self.percentile)
+        return None if value is None else max(value, self.min_delay)
+
+    def _timed(self, tracker, model, messages):
+        started = time.perf_counter()
+        response = model.invoke(messages)
+        tracker.add(time.perf_counter() - started)
+        return response
+
+    def invoke(self, model, messages, call_type):
+        """
+        Invoke a chat model, hedging the request if it runs slow.
+
+        Args:
+            model: Chat model with an `invoke` method
+            messages: Prompt string or messages passed to `invoke`
+            call_type (str): "debate_turn", "follow_up" or "chat"
+
+        Returns:
+            The first successful response
+        """
+        if not self.enabled:
+            return model.invoke(messages)
+
+        tracker = self._tracker(call_type)
+        threshold = self.threshold(call_type)
+        if threshold is None:
+            # Not enough history yet: call directly, but still learn the latency
+            self._mark(call_type, False)
+            return self._timed(tracker, model, messages)
+
+        pool = self._pool()
+        primary = pool.submit(self._timed, tracker, model, messages)
+        done, _ = wait([primary], timeout=threshold)
+        if done or not self._allow_hedge(call_type):
+            self._mark(call_type, False)
+            if not done:
+                METRICS.inc("llm_hedges_skipped_total", call_type=call_type)
+            return primary.result()
+
+        self._mark(call_type, True)
+        METRICS.inc("llm_hedges_total", call_type=call_type)
+        hedge = pool.submit(self._timed, tracker, model, messages)
+
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                for loser in (done | pending) - {future}:
+                    loser.cancel()
+                    loser.add_done_callback(lambda f: count_abandoned(f, call_type))
+                if future is hedge:
+                    METRICS.inc("llm_hedge_wins_total", call_type=call_type)
+                return future.result()
+        raise error
+
+    def stats(self):
+        """Return the current threshold and hedge rate per call type."""
+        with self._lock:
+            call_types = list(self._trackers)
+        stats = {}
+        for call_type in call_types:
+            with self._lock:
+                recent = list(self._hedged[call_type])
+            stats[call_type] = {
+                'threshold': self.threshold(call_type),
+                'hedge_rate': sum(recent) / len(recent) if recent else 0.0
+            }
+        return stats
@@ -0,0 +1,322 @@
+"""
+Bulk ingestion of debater transcripts into the groupdebate index.
+
+Source documents are read from one directory per namespace, for example
+`corpus/samaltman/*.txt`. Documents are streamed, chunked and embedded in
+batches, and the batches are upserted in parallel with `source` metadata set
+to the document's path relative to its namespace directory.
+
+With `--sync`, a manifest of chunk content hashes per namespace is kept in
+`--manifest-dir` so only new or changed chunks are embedded and vectors of
+removed chunks are deleted. `--dry-run` prints the diff without changing
+anything.
+
+    python ingest.py corpus --namespace samaltman --namespace elonmusk
+    python ingest.py corpus --local-store local_index.json
+    python ingest.py corpus --sync --dry-run
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby, islice
+
+# Default pipeline settings
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MANIFEST_DIR = "manifests"
+DELETE_BATCH_SIZE = 1000
+SOURCE_EXTENSIONS = (".txt", ".md")
+TEXT_KEY = "text"
+
+
+# Stream source documents one at a time
+def iter_documents(source_dir, namespaces=None):
+    """Yield (namespace, source, text) for every document under the source directory."""
+    for namespace in sorted(os.listdir(source_dir)):
+        namespace_dir = os.path.join(source_dir, namespace)
+        if not os.path.isdir(namespace_dir) or (namespaces and namespace not in namespaces):
+            continue
+        for root, _, files in os.walk(namespace_dir):
+            for name in sorted(files):
+                if not name.endswith(SOURCE_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                with open(path, encoding="utf-8") as f:
+                    text = f.read()
+                yield namespace, os.path.relpath(path, namespace_dir), text
+
+
+# Split a document into overlapping chunks on whitespace boundaries
+def chunk_text(text, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP):
+    """Yield chunks of at most `chunk_size` characters with `chunk_overlap` characters of overlap."""
+    text = " ".join(text.split())
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            # Break at the last space so words are not cut in half
+            space = text.rfind(" ", start + chunk_overlap + 1, end)
+            if space != -1:
+                end = space
+        yield text[start:end]
+        if end >= len(text):
+            return
+        start = max(end - chunk_overlap, start + 1)
+        # Start the next chunk on a word boundary
+        space = text.find(" ", start, end)
+        if space != -1:
+            start = space + 1
+
+
+def chunk_hash(namespace, source, text):
+    """Return the content hash of a chunk, including the source it is cited as."""
+    return hashlib.sha256(f"{namespace}\0{source}\0{text}".encode("utf-8")).hexdigest()
+
+
+def chunk_id(namespace, source, text):
+    """Return a stable vector id derived from a chunk's namespace, source and content."""
+    return chunk_hash(namespace, source, text)[:32]
+
+
+def iter_chunks(documents, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP):
+    """Yield (namespace, id, text, metadata) for every chunk of every document."""
+    for namespace, source, text in documents:
+        for chunk in chunk_text(text, chunk_size, chunk_overlap):
+            yield namespace, chunk_id(namespace, source, chunk), chunk, {'source': source}
+
+
+def batched(iterable, size):
+    """Yield lists of up to `size` items."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class PineconeTarget:
+    """Upserts into the Pinecone index used by `retrieve_knowledge`."""
+
+    def __init__(self):
+        from back_end import get_vectorstore
+        self._get_vectorstore = get_vectorstore
+
+    def upsert(self, namespace, vectors):
+        self._get_vectorstore(namespace).index.upsert(vectors=vectors, namespace=namespace)
+
+    def delete(self, namespace, ids):
+        self._get_vectorstore(namespace).index.delete(ids=ids, namespace=namespace)
+
+    def save(self):
+        pass
+
+
+def ingest(chunks, embeddings, target, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Embed and upsert chunks in parallel batches, one namespace at a time.
+
+    At most `max_workers` batches are embedded and upserted concurrently, and
+    at most twice that many are held in memory.
+
+    Args:
+        chunks (iterable): (namespace, id, text, metadata) tuples grouped by namespace
+        embeddings: Embeddings model with an `embed_documents` method
+        target: Vector store target with an `upsert(namespace, vectors)` method
+        batch_size (int): Chunks per embedding and upsert call
+        max_workers (int): Number of batches processed concurrently
+
+    Returns:
+        dict: Chunk counts per namespace, elapsed seconds and chunks per second
+    """
+    counts = {}
+    counts_lock = threading.Lock()
+    in_flight = threading.BoundedSemaphore(max_workers * 2)
+    errors = []
+    started = time.perf_counter()
+
+    def process(namespace, batch):
+        try:
+            texts = [text for _, _, text, _ in batch]
+            vectors = embeddings.embed_documents(texts)
+            target.upsert(namespace, [
+                (record_id, values, {**metadata, TEXT_KEY: text})
+                for (_, record_id, text, metadata), values in zip(batch, vectors)
+            ])
+            with counts_lock:
+                counts[namespace] = counts.get(namespace, 0) + len(batch)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for namespace, namespace_chunks in groupby(chunks, key=lambda chunk: chunk[0]):
+            for batch in batched(namespace_chunks, batch_size):
+                in_flight.acquire()
+                pool.submit(process, namespace, batch)
+
+    target.save()
+    if errors:
+        raise errors[0]
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    return {
+        'namespaces': counts,
+        'chunks': total,
+        'seconds': elapsed,
+        'chunks_per_second': total / elapsed if elapsed else 0.0
+    }
+
+
+def manifest_path(manifest_dir, namespace):
+    return os.path.join(manifest_dir, f"{namespace}.json")
+
+
+def load_manifest(manifest_dir, namespace):
+    """Return the manifest of a namespace, mapping chunk hashes to vector ids and sources."""
+    path = manifest_path(manifest_dir, namespace)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)['chunks']
+
+
+def save_manifest(manifest_dir, namespace, chunks, chunk_size, chunk_overlap):
+    os.makedirs(manifest_dir, exist_ok=True)
+    path = manifest_path(manifest_dir, namespace)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            'namespace': namespace,
+            'chunk_size': chunk_size,
+            'chunk_overlap': chunk_overlap,
+            'chunks': chunks
+        }, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def plan_sync(source_dir, manifest_dir, namespaces=None, chunk_size=DEFAULT_CHUNK_SIZE,
+              chunk_overlap=DEFAULT_CHUNK_OVERLAP):
+    """
+    Diff the source documents against the manifests.
+
+    Returns:
+        dict: Per namespace, the chunks to add, the vector ids to delete, the
+        number of unchanged chunks and the manifest after the sync
+    """
+    if not namespaces:
+        # Include namespaces that only have a manifest so their vectors get deleted
+        namespaces = {name for name in os.listdir(source_dir) if os.path.isdir(os.path.join(source_dir, name))}
+        if os.path.isdir(manifest_dir):
+            namespaces |= {name[:-len(".json")] for name in os.listdir(manifest_dir) if name.endswith(".json")}
+        namespaces = sorted(namespaces)
+
+    plans = {}
+    for namespace in namespaces:
+        old = load_manifest(manifest_dir, namespace)
+        new = {}
+        added = []
+        if os.path.isdir(os.path.join(source_dir, namespace)):
+            for _, source, text in iter_documents(source_dir, [namespace]):
+                for chunk in chunk_text(text, chunk_size, chunk_overlap):
+                    digest = chunk_hash(namespace, source, chunk)
+                    if digest in new:
+                        continue
+                    new[digest] = {'id': digest[:32], 'source': source}
+                    if digest not in old:
+                        added.append((namespace, digest[:32], chunk, {'source': source}))
+
+        removed = {digest: entry for digest, entry in old.items() if digest not in new}
+        plans[namespace] = {
+            'added': added,
+            'removed': [entry['id'] for entry in removed.values()],
+            'removed_sources': sorted({entry['source'] for entry in removed.values()}),
+            'unchanged': len(new) - len(added),
+            'manifest': new
+        }
+    return plans
+
+
+def print_sync_report(plans, dry_run):
+    prefix = "Would" if dry_run else "Will"
+    for namespace, plan in plans.items():
+        added_sources = sorted({metadata['source'] for _, _, _, metadata in plan['added']})
+        print(f"{namespace}: {prefix.lower()} add {len(plan['added'])}, delete {len(plan['removed'])}, "
+              f"keep {plan['unchanged']} chunks")
+        for source in added_sources:
+            print(f"  + {source}")
+        for source in plan['removed_sources']:
+            print(f"  - {source}")
+
+
+def sync(plans, embeddings, target, manifest_dir, chunk_size=DEFAULT_CHUNK_SIZE,
+         chunk_overlap=DEFAULT_CHUNK_OVERLAP, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS):
+    """Apply sync plans: upsert new chunks, delete removed vectors and write the manifests."""
+    added = [chunk for plan in plans.values() for chunk in plan['added']]
+    stats = ingest(added, embeddings, target, batch_size, max_workers)
+
+    for namespace, plan in plans.items():
+        for ids in batched(plan['removed'], DELETE_BATCH_SIZE):
+            target.delete(namespace, ids)
+        save_manifest(manifest_dir, namespace, plan['manifest'], chunk_size, chunk_overlap)
+
+    target.save()
+    stats['deleted'] = sum(len(plan['removed']) for plan in plans.values())
+    return stats
+
+
+def print_report(stats):
+    for namespace, count in sorted(stats['namespaces'].items()):
+        print(f"{namespace:>20}: {count} chunks")
+    print(f"Ingested {stats['chunks']} chunks in {stats['seconds']:.1f}s "
+          f"({stats['chunks_per_second']:.1f} chunks/s)")
+    if 'deleted' in stats:
+        print(f"Deleted {stats['deleted']} vectors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source_dir", help="Directory with one subdirectory per namespace")
+    parser.add_argument("--namespace", action="append", help="Only ingest these namespaces")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=DEFAULT_CHUNK_OVERLAP)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--local-store", help="Upsert into a local JSON vector store with stand-in embeddings")
+    parser.add_argument("--sync", action="store_true", help="Only embed new or changed chunks and delete removed ones")
+    parser.add_argument("--manifest-dir", default=DEFAULT_MANIFEST_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="With --sync, only print what would change")
+    args = parser.parse_args()
+
+    if args.sync:
+        plans = plan_sync(args.source_dir, args.manifest_dir, args.namespace, args.chunk_size, args.chunk_overlap)
+        print_sync_report(plans, args.dry_run)
+        if args.dry_run:
+            return
+
+    if args.local_store:
+        from stand_ins import LocalVectorStore, StandInEmbeddings
+        target = LocalVectorStore(args.local_store)
+        embeddings = StandInEmbeddings()
+    else:
+        from back_end import get_embeddings
+        target = PineconeTarget()
+        embeddings = get_embeddings(os.environ["GOOGLE_API_KEY"])
+
+    if args.sync:
+        print_report(sync(plans, embeddings, target, args.manifest_dir, args.chunk_size,
+                          args.chunk_overlap, args.batch_size, args.max_workers))
+        return
+
+    documents = iter_documents(args.source_dir, args.namespace)
+    chunks = iter_chunks(documents, args.chunk_size, args.chunk_overlap)
+    print_report(ingest(chunks, embeddings, target, args.batch_size, args.max_workers))
+
+
+if __name__ == "__main__":
+    main()
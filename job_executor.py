@@ -0,0 +1,209 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cancellation import Cancelled, CancellationToken
+from metrics import METRICS
+
+# Default limits shared by every session on the server
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_QUEUED = 32
+DEFAULT_RESULT_TTL = 30 * 60
+DEFAULT_ABANDON_AFTER = 30.0
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has reached its global limit."""
+
+
+class Job:
+    """A unit of work submitted to the executor on behalf of a session."""
+
+    def __init__(self, job_id, session_id, key, cancel_token=None):
+        self.id = job_id
+        self.session_id = session_id
+        self.key = key
+        self.cancel_token = cancel_token or CancellationToken()
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.polled_at = self.submitted_at
+        self.progress = None
+        self._finished = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATUSES
+
+    def report_progress(self, event):
+        """Keep the latest progress event reported by the job's work."""
+        self.progress = event
+
+    def wait(self, timeout=None):
+        """Block until the job finishes or `timeout` passes; return whether it finished."""
+        return self._finished.wait(timeout)
+
+
+class JobExecutor:
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_queued=DEFAULT_MAX_QUEUED,
+                 result_ttl=DEFAULT_RESULT_TTL, abandon_after=DEFAULT_ABANDON_AFTER, name="debate-job"):
+        """
+        Run long jobs on a bounded worker pool shared by all sessions.
+
+        Sessions poll their jobs with `get`. An active job that has not been
+        polled for `abandon_after` seconds belongs to a closed tab and is
+        cancelled.
+
+        Args:
+            max_workers (int): Maximum number of jobs running at once
+            max_queued (int): Maximum number of jobs waiting for a worker
+            result_ttl (float): Seconds a finished job is kept for polling
+            abandon_after (float): Seconds without a poll before an active job is cancelled
+            name (str): Prefix of the worker thread names and job ids
+        """
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.abandon_after = abandon_after
+        self.name = name
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        self._reaper = threading.Thread(target=self._reap, name="job-reaper", daemon=True)
+        self._reaper.start()
+
+    def submit(self, session_id, key, fn, *args, cancel_token=None, track_progress=False, **kwargs):
+        """
+        Submit a job, or return the session's active job with the same key.
+
+        Args:
+            session_id (str): Id of the submitting session
+            key (hashable): Identifies the work so resubmissions can be deduplicated
+            fn (callable): Function to run on a worker
+            cancel_token (CancellationToken): If given, passed on to `fn` as
+                `cancel_token` and cancelled by `cancel`
+            track_progress (bool): Pass `on_progress` to `fn`, storing its events in `Job.progress`
+
+        Returns:
+            Job: The submitted or already active job
+        """
+        with self._lock:
+            self._prune()
+
+            for job in self._jobs.values():
+                if (job.session_id == session_id and job.key == key and job.active
+                        and not job.cancel_token.cancelled):
+                    return job
+
+            queued = sum(1 for job in self._jobs.values() if job.status == QUEUED)
+            if queued >= self.max_queued:
+                raise QueueFullError("The server is busy, please try again in a moment.")
+
+            job = Job(f"{self.name}-{next(self._ids)}", session_id, key, cancel_token)
+            self._jobs[job.id] = job
+
+        if cancel_token is not None:
+            kwargs['cancel_token'] = cancel_token
+        if track_progress:
+            kwargs['on_progress'] = job.report_progress
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        """Return a job by id, or None if it is unknown or expired. Counts as a poll."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.polled_at = time.time()
+            return job
+
+    def cancel(self, job_id, reason="cancelled"):
+        """Cancel a job; a queued job never starts and a running job stops at its next call."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.active:
+                return False
+            if job.status == QUEUED:
+                job.status = CANCELLED
+                job.finished_at = time.time()
+                job._finished.set()
+        job.cancel_token.cancel(reason)
+        return True
+
+    def cancel_session(self, session_id, reason="cancelled"):
+        """Cancel every active job of a session and return how many were cancelled."""
+        with self._lock:
+            job_ids = [job.id for job in self._jobs.values() if job.session_id == session_id and job.active]
+        return sum(self.cancel(job_id, reason) for job_id in job_ids)
+
+    def queue_position(self, job_id):
+        """Return how many queued jobs were submitted before this one."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return 0
+            return sum(1 for other in self._jobs.values()
+                       if other.status == QUEUED and other.submitted_at < job.submitted_at)
+
+    def stats(self):
+        """Return the number of jobs in each status."""
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0, CANCELLED: 0}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def _run(self, job, fn, args, kwargs):
+        with self._lock:
+            if job.status == CANCELLED:
+                METRICS.inc("cancellations_total", work="queued_job", reason=job.cancel_token.reason)
+                return
+            # Set before the status, since pollers read both without the lock
+            job.started_at = time.time()
+            job.status = RUNNING
+        try:
+            job.result = fn(*args, **kwargs)
+            job.status = DONE
+        except Cancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = e
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            job._finished.set()
+
+    def _reap(self):
+        """Cancel active jobs that their session has stopped polling."""
+        while True:
+            time.sleep(max(self.abandon_after / 3, 1.0))
+            cutoff = time.time() - self.abandon_after
+            with self._lock:
+                abandoned = [job.id for job in self._jobs.values() if job.active and job.polled_at < cutoff]
+            for job_id in abandoned:
+                self.cancel(job_id, reason="abandoned")
+
+    def _prune(self):
+        """Drop finished jobs older than the result TTL. Caller holds the lock."""
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if not job.active and job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
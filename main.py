@@ -1,10 +1,19 @@
 import os
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
 import streamlit as st
 from prompt import prompt_sam, debater_prompts
-from back_end import DEBATERS
+from back_end import CASSETTE, DEBATERS, ROUTER, open_index
+from metrics import METRICS
+from usage import (CHARS_PER_TOKEN, EXPECTED_OUTPUT_TOKENS, TokenBudgetExceeded, TokenReservations,
+                   budget_action, estimate_tokens, record_usage, total_tokens)
+from semantic_cache import (SemanticAnswerCache, DEFAULT_SIMILARITY_THRESHOLD,
+                            DEFAULT_TTL_SECONDS, DEFAULT_MAX_ENTRIES)
+from compression import ExtractiveCompressor, DEFAULT_MAX_CHARS
 
 # Set API keys from Streamlit secrets
 os.environ["OPENAI_API_KEY"] = st.secrets["general"]["OPENAI_API_KEY"]
@@ -17,7 +26,9 @@ os.environ["LANGCHAIN_PROJECT"] = "Group Debating"
 
 class GroupDebateQA:
     def __init__(self, model_name='models/text-embedding-004', llm_model='gemini-2.0-flash',
-                 index_name="groupdebate", namespace=None):
+                 index_name="groupdebate", namespace=None,
+                 cache_threshold=DEFAULT_SIMILARITY_THRESHOLD, cache_ttl=DEFAULT_TTL_SECONDS,
+                 cache_max_entries=DEFAULT_MAX_ENTRIES, router=None, compression_max_chars=DEFAULT_MAX_CHARS):
         """
         Initialize the GroupDebateQA class with model parameters.
         
@@ -26,27 +37,41 @@ class GroupDebateQA:
             llm_model (str): LLM model name
             index_name (str): Pinecone index name
             namespace (str): Pinecone namespace (optional)
+            cache_threshold (float): Cosine similarity needed to reuse a cached answer
+            cache_ttl (float): Seconds a cached answer stays valid
+            cache_max_entries (int): Maximum cached answers per (debater, k)
+            router (ModelRouter): Picks the model for each answer (defaults to the shared router)
+            compression_max_chars (int): Character budget for the retrieved context, None to send it in full
         """
        
         # Initialize embedding model
-        self.embeddings = GoogleGenerativeAIEmbeddings(model=model_name)
+        self.embeddings = CASSETTE.embeddings(lambda: GoogleGenerativeAIEmbeddings(model=model_name))
         
         # Initialize LLM
-        self.llm = ChatGoogleGenerativeAI(model=llm_model, temperature=0.0)
+        self.llm = CASSETTE.chat_model(llm_model, lambda: ChatGoogleGenerativeAI(model=llm_model, temperature=0.0))
+        self.llms = {(llm_model, 0): self.llm}
+        self.router = router or ROUTER
         
         # Store index name for later use
         self.index_name = index_name
         
+        # One vector store per namespace, so debaters can be searched concurrently
+        self.vectorstores = {}
+        self._vectorstores_lock = threading.Lock()
+
         # Initialize vector store if namespace is provided
-        if namespace:
-            self.vectorstore = PineconeVectorStore(
-                index_name=index_name,
-                embedding=self.embeddings,
-                namespace=namespace
-            )
-        else:
-            self.vectorstore = None
-            self.namespace = None
+        self.vectorstore = self._get_vectorstore(namespace) if namespace else None
+        self.namespace = namespace
+
+        # Compress retrieved context to the sentences relevant to the question
+        self.compressor = (ExtractiveCompressor(self.embeddings, max_chars=compression_max_chars)
+                           if compression_max_chars else None)
+
+        # Semantic answer caches, one per (debater, k)
+        self.cache_threshold = cache_threshold
+        self.cache_ttl = cache_ttl
+        self.cache_max_entries = cache_max_entries
+        self.answer_caches = {}
        
     def search_similar_documents(self, query, k=5, namespace=None):
         """
@@ -60,21 +85,163 @@ class GroupDebateQA:
         Returns:
             list: List of similar documents
         """
-        # If a new namespace is provided, create a new vector store
-        if namespace and (not self.vectorstore or namespace != self.namespace):
-            self.vectorstore = PineconeVectorStore(
-                index_name=self.index_name,
-                embedding=self.embeddings,
-                namespace=namespace
-            )
-            self.namespace = namespace
-            
+        return self._get_vectorstore(namespace).similarity_search(query, k=k)
+
+    def _get_vectorstore(self, namespace=None):
+        """Return the vector store for a namespace, creating it on first use."""
+        if namespace:
+            with self._vectorstores_lock:
+                if namespace not in self.vectorstores:
+                    self.vectorstores[namespace] = CASSETTE.vectorstore(namespace, lambda: PineconeVectorStore(
+                        index_name=self.index_name,
+                        embedding=self.embeddings,
+                        namespace=namespace
+                    ))
+                return self.vectorstores[namespace]
+
         if self.vectorstore:
-            return self.vectorstore.similarity_search(query, k=k)
+            return self.vectorstore
         else:
             raise ValueError("No vector store initialized. Please provide a namespace.")
+
+    def get_llm(self, model_name, temperature=0):
+        """Return a chat model client, creating one per (model, temperature) on first use."""
+        if (model_name, temperature) not in self.llms:
+            self.llms[(model_name, temperature)] = CASSETTE.chat_model(
+                model_name, lambda: ChatGoogleGenerativeAI(model=model_name, temperature=temperature)
+            )
+        return self.llms[(model_name, temperature)]
+
+    def get_answer_cache(self, debater_name, k):
+        """Return the semantic answer cache for a debater and retrieval depth."""
+        return self.answer_caches.setdefault(
+            (debater_name, k),
+            SemanticAnswerCache(
+                threshold=self.cache_threshold,
+                ttl_seconds=self.cache_ttl,
+                max_entries=self.cache_max_entries
+            )
+        )
+
+    def answer_question(self, query, debater_name, k=5, system_prompt=prompt_sam, usage_log=None,
+                        token_budget=0, query_vector=None, reservations=None):
+        """
+        Answer a question for a debater, reusing answers to near-duplicate questions.
+
+        The question is embedded once. On a cache hit that embedding is the only
+        remote call; on a miss it is reused for the similarity search.
+
+        Args:
+            query (str): Question to ask
+            debater_name (str): Name of the debater answering
+            k (int): Number of documents to retrieve
+            system_prompt (str): Optional system prompt to use
+            usage_log (list): Session usage entries to record token usage in (optional)
+            token_budget (int): Maximum tokens for the session, 0 for unlimited
+            query_vector (list): Embedding of the query, if it was already embedded
+            reservations (TokenReservations): Tokens reserved by answers running in
+                parallel against the same budget (optional)
+
+        Returns:
+            dict: Answer, sources, retrieved documents and whether it was cached
+
+        Raises:
+            TokenBudgetExceeded: If the session has no budget left for an answer
+        """
+        CASSETTE.note("chat", query=query, debater_name=debater_name, k=k)
+        if query_vector is None:
+            query_vector = self.embeddings.embed_query(query)
+        cache = self.get_answer_cache(debater_name, k)
+
+        cached = cache.lookup(query_vector)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+        namespace = DEBATERS[debater_name]["namespace"]
+        similar_docs = self._get_vectorstore(namespace).similarity_search_by_vector(query_vector, k=k)
+
+        # Drop the lowest ranked documents until the answer fits in the session budget,
+        # counting the tokens reserved by panel answers still running
+        context_docs = similar_docs
+        reserved = 0
+        if token_budget:
+            with reservations.lock if reservations is not None else nullcontext():
+                spent = total_tokens(usage_log or []) + (reservations.tokens if reservations is not None else 0)
+                prompt_chars = len(debater_prompts.get(debater_name, system_prompt)) + len(query)
+                while True:
+                    prompt_tokens = (prompt_chars + sum(len(doc.page_content) for doc in context_docs)) // CHARS_PER_TOKEN
+                    action = budget_action(spent, prompt_tokens, token_budget)
+                    if action == "ok":
+                        break
+                    if action == "stop" or not context_docs:
+                        raise TokenBudgetExceeded("This session has reached its usage limit.")
+                    context_docs = context_docs[:-1]
+                if reservations is not None:
+                    reserved = prompt_tokens + EXPECTED_OUTPUT_TOKENS
+                    reservations.tokens += reserved
+
+        try:
+            response = self.ask_question_with_custom_context(
+                query,
+                search_results=context_docs,
+                system_prompt=system_prompt,
+                debater_name=debater_name,
+                usage_log=usage_log,
+                query_vector=query_vector
+            )
+        finally:
+            if reserved:
+                reservations.release(reserved)
+        result = {**response, "documents": similar_docs}
+        cache.add(query_vector, result)
+
+        return {**result, "cached": False}
+
+    def answer_panel(self, query, debater_names, k=5, usage_log=None, token_budget=0):
+        """
+        Answer a question for several debaters at once.
+
+        The question is embedded once; the debaters' namespaces are searched and
+        their answers generated in parallel, so the panel takes about as long
+        as its slowest debater. Each answer reserves its estimated tokens before
+        it runs, so together they stay within the session budget.
+
+        Args:
+            query (str): Question to ask
+            debater_names (list): Names of the debaters answering
+            k (int): Number of documents to retrieve per debater
+            usage_log (list): Session usage entries to record token usage in (optional)
+            token_budget (int): Maximum tokens for the session, 0 for unlimited
+
+        Yields:
+            tuple: (debater name, result of `answer_question` or None, exception or None)
+            for each debater, in the order the answers finish
+        """
+        query_vector = self.embeddings.embed_query(query)
+        reservations = TokenReservations()
+        with ThreadPoolExecutor(max_workers=len(debater_names), thread_name_prefix="panel") as pool:
+            futures = {
+                pool.submit(
+                    self.answer_question,
+                    query,
+                    debater_name,
+                    k=k,
+                    system_prompt=debater_prompts.get(debater_name, prompt_sam),
+                    usage_log=usage_log,
+                    token_budget=token_budget,
+                    query_vector=query_vector,
+                    reservations=reservations
+                ): debater_name
+                for debater_name in debater_names
+            }
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, e
     
-    def ask_question_with_custom_context(self, query, search_results, system_prompt=prompt_sam, debater_name="Sam Altman"):
+    def ask_question_with_custom_context(self, query, search_results, system_prompt=prompt_sam, debater_name="Sam Altman",
+                                         usage_log=None, query_vector=None):
         """
         Ask a question using specific search results as context.
         For more direct control over the context provided to the LLM.
@@ -84,6 +251,9 @@ class GroupDebateQA:
             search_results (list): Search results to use as context
             system_prompt (str): Optional system prompt to use
             debater_name (str): Name of the debater to use for the prompt
+            usage_log (list): Session usage entries to record token usage in (optional)
+            query_vector (list): Embedding of the query; if given, the context is
+                compressed to the sentences most relevant to it
             
         Returns:
             dict: Answer and sources
@@ -95,6 +265,13 @@ class GroupDebateQA:
         # Extract content from search results
         contexts = [doc.page_content for doc in search_results]
         sources = [doc.metadata.get('source', 'Unknown') for doc in search_results]
+        if query_vector is not None and self.compressor is not None:
+            chunks = [{'content': content, 'source': source} for content, source in zip(contexts, sources)]
+            try:
+                contexts = [item['content'] for item in self.compressor.compress(query_vector, chunks)]
+            except Exception:
+                # Send the chunks in full rather than fail the answer
+                pass
         
         # Build a consolidated context string
         context_str = "\n\n".join([f"Context {i+1}:\n{context}" 
@@ -106,11 +283,31 @@ class GroupDebateQA:
             {"role": "user", "content": f"Context information:\n{context_str}\n\nQuestion: {query}"}
         ]
         
-        # Directly use the ChatOpenAI model
-        response = self.llm.invoke(messages)
+        # Route the call to a model, falling back if it is slow or rate limited
+        response, model_name = self.router.invoke("chat", messages, self.get_llm, estimate_tokens(messages))
+        if usage_log is not None:
+            record_usage(usage_log, response, "chatbot", "chat", debater_name, model=model_name)
+            METRICS.flush()
         
         # Format the response to match the expected output structure
         return {
             "answer": response.content,
             "sources": ", ".join(set(sources))  # Deduplicated list of sources
         }
+
+
+def warm_up_stages(get_engine):
+    """
+    Return (name, callable) warm-up stages for the chatbot.
+
+    The first stage creates the QA engine through `get_engine`, so it is built
+    in the background too; the others embed once and open every debater's index.
+    """
+    stages = [
+        ("QA engine", get_engine),
+        ("Embeddings", lambda: get_engine().embeddings.embed_query("warm-up"))
+    ]
+    for name, debater in DEBATERS.items():
+        stages.append((f"{name}'s index",
+                       lambda namespace=debater["namespace"]: open_index(get_engine()._get_vectorstore(namespace))))
+    return stages
@@ -0,0 +1,53 @@
+import os
+import threading
+
+# Prometheus textfile export path, if set
+METRICS_FILE_ENV = "GROUPDEBATE_METRICS_FILE"
+
+
+class MetricsRegistry:
+    """Process-wide counters with labels, exportable in the Prometheus text format."""
+
+    def __init__(self, export_path=None):
+        self.export_path = export_path
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """Add `value` to the counter `name` with the given labels."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def get(self, name, **labels):
+        """Return the sum of a counter over every label set matching `labels`."""
+        with self._lock:
+            return sum(
+                value for (counter, counter_labels), value in self._counters.items()
+                if counter == name and set(labels.items()) <= set(counter_labels)
+            )
+
+    def snapshot(self):
+        """Return a copy of every counter keyed by (name, labels)."""
+        with self._lock:
+            return dict(self._counters)
+
+    def to_prometheus(self):
+        """Render every counter in the Prometheus text exposition format."""
+        lines = []
+        for (name, labels), value in sorted(self.snapshot().items()):
+            label_str = ",".join(f'{key}="{label}"' for key, label in labels)
+            lines.append(f"groupdebate_{name}{{{label_str}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Write the counters to the export path, if one is configured."""
+        if not self.export_path:
+            return
+        tmp_path = f"{self.export_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, self.export_path)
+
+
+METRICS = MetricsRegistry(os.environ.get(METRICS_FILE_ENV))
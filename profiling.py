@@ -0,0 +1,142 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from metrics import METRICS
+
+# Directory that saved profiles are written to
+PROFILE_DIR = os.environ.get("GROUPDEBATE_PROFILE_DIR", "profiles")
+
+# Default sampling settings
+DEFAULT_INTERVAL = 0.005
+DEFAULT_TOP = 15
+
+# Only stacks passing through these files count as app work; idle pool workers
+# and Streamlit's event loop are left out
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Background threads of the app that only sleep between housekeeping passes
+IGNORED_THREADS = ("profiler", "job-reaper", "feedback-queue")
+
+# Files whose frames, at the top of a stack, mean the thread is blocked on the
+# network, a lock or a sleep rather than running Python code
+WAIT_FILES = ("socket.py", "ssl.py", "selectors.py", "threading.py", "queue.py")
+
+
+def frame_label(code):
+    """Return a stable label for a code object: function (file:first line)."""
+    path = code.co_filename
+    for marker in ("site-packages" + os.sep, APP_ROOT + os.sep):
+        if marker in path:
+            path = path.split(marker, 1)[1]
+            break
+    else:
+        path = os.path.basename(path)
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+def is_waiting(code):
+    return os.path.basename(code.co_filename) in WAIT_FILES
+
+
+class SamplingProfiler:
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        """
+        Sample the Python stacks of every thread doing app work.
+
+        A background thread reads `sys._current_frames()` every `interval`
+        seconds, so work spread over the job executor, LangGraph's node threads,
+        the hedging pool and the Streamlit script thread is all captured. The
+        profile is process-wide: requests from other sessions running at the
+        same time are included too.
+
+        Args:
+            interval (float): Seconds between samples
+        """
+        self.interval = interval
+        self.stacks = Counter()
+        self.waiting = 0
+        self.samples = 0
+        self.started_at = None
+        self.seconds = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start sampling in the background."""
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and wait for the sampler thread to exit."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.seconds = time.perf_counter() - self.started_at
+        METRICS.inc("profiles_total")
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            ignored = {thread.ident for thread in threading.enumerate() if thread.name in IGNORED_THREADS}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in ignored:
+                    self._sample(frame)
+
+    def _sample(self, frame):
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        if not any(code.co_filename.startswith(APP_ROOT) for code in codes):
+            return
+        self.stacks[tuple(frame_label(code) for code in reversed(codes))] += 1
+        self.samples += 1
+        if is_waiting(codes[0]):
+            self.waiting += 1
+
+    def folded(self):
+        """Return the profile in collapsed-stack format, readable by flamegraph.pl, speedscope and inferno."""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def save(self, name, directory=PROFILE_DIR):
+        """Write the collapsed stacks to `<directory>/<name>-<timestamp>.folded` and return the path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.folded())
+        return path
+
+    def summary(self, top=DEFAULT_TOP):
+        """
+        Summarize where the sampled time went.
+
+        Returns:
+            dict: seconds, samples, the fraction of samples blocked waiting,
+            and the `top` functions by self and by total samples
+        """
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+
+        def share(counter):
+            return [(label, count / self.samples) for label, count in counter.most_common(top)]
+
+        return {
+            'seconds': self.seconds,
+            'samples': self.samples,
+            'waiting': self.waiting / self.samples if self.samples else 0.0,
+            'self': share(own) if self.samples else [],
+            'total': share(total) if self.samples else []
+        }
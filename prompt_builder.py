@@ -0,0 +1,128 @@
+import hashlib
+
+# Approximate characters per token, used to estimate prompts and report prompt reuse
+CHARS_PER_TOKEN = 4
+
+
+class PrefixCache:
+    """
+    Interface for caching the static prompt prefix of a debater.
+
+    Implementations may register the prefix with a provider-side context cache
+    and return a handle (for example a Gemini `cached_content` name) that is
+    passed to the model. Returning None means the prefix is sent inline.
+    """
+
+    def attach(self, key, prefix):
+        """
+        Return a provider cache handle for the prefix, or None.
+
+        A returned handle must refer to cached content whose system instruction
+        is exactly `prefix`. The caller then drops the system message and sends
+        only the turn's user message, so the prefix is never sent twice.
+        """
+        return None
+
+
+class InMemoryPrefixCache(PrefixCache):
+    """Prefix cache that only tracks reuse, useful for benchmarks and local runs."""
+
+    def __init__(self):
+        self.prefixes = {}
+        self.hits = 0
+        self.misses = 0
+        self.reused_chars = 0
+
+    def attach(self, key, prefix):
+        if self.prefixes.get(key) == prefix:
+            self.hits += 1
+            self.reused_chars += len(prefix)
+        else:
+            self.misses += 1
+            self.prefixes[key] = prefix
+        return None
+
+
+def prefix_key(debater_name, prefix):
+    """Return a stable cache key for a debater's static prefix."""
+    digest = hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:16]
+    return f"{debater_name}:{digest}"
+
+
+def format_knowledge(knowledge):
+    """Format retrieved knowledge as a numbered list."""
+    return "\n".join(f"{i+1}. {item['content']}" for i, item in enumerate(knowledge))
+
+
+def build_debater_prefix(debater_name, topic, description, character_prompt, knowledge):
+    """
+    Build the static system prompt for a debater.
+
+    The prefix only depends on the debater, topic and retrieved knowledge, so it
+    is built once per debate and sent unchanged on every turn.
+    """
+    parts = [
+        f'You are {debater_name}, participating in a debate on the topic: "{topic}".',
+        "",
+        f"Character guidance for {debater_name}:",
+        character_prompt.strip(),
+        f"- {description}",
+        f"- Use the speaking style, mannerisms, and viewpoints that {debater_name} is known for",
+        f"- Reference relevant companies, projects, or initiatives that {debater_name} is associated with",
+        f"- Make arguments that align with {debater_name}'s known positions",
+        "- limit your response to 1-2 paragraphs maximum and within 100 words.",
+    ]
+    if knowledge:
+        parts += ["", "Relevant knowledge for your reference:", format_knowledge(knowledge)]
+    return "\n".join(parts)
+
+
+def format_round(debaters, round_data):
+    """Format one round of the debate history."""
+    return "\n".join(f"{debater}: {round_data[debater]}" for debater in debaters if debater in round_data)
+
+
+def build_turn_messages(prefix, debater_name, debaters, current_round, max_rounds, history,
+                        max_previous_rounds=None):
+    """
+    Build the structured messages for one debate turn.
+
+    Args:
+        prefix (str): Static system prompt from `build_debater_prefix`
+        debater_name (str): Name of the speaking debater
+        debaters (list): Debaters in speaking order
+        current_round (int): Current round number, starting at 1
+        max_rounds (int): Total number of rounds
+        history (list): Debate history, one dict per round
+        max_previous_rounds (int): Only include this many earlier rounds (optional)
+
+    Returns:
+        list: System and user messages
+    """
+    parts = []
+
+    # Add previous rounds first so the message grows append-only across turns
+    last_previous = min(current_round - 1, len(history))
+    first_previous = 0 if max_previous_rounds is None else max(0, last_previous - max_previous_rounds)
+    previous_rounds = [
+        f"Round {round_idx + 1}:\n{format_round(debaters, history[round_idx])}"
+        for round_idx in range(first_previous, last_previous)
+    ]
+    if previous_rounds:
+        parts += ["Previous rounds:", *previous_rounds, ""]
+
+    # Add previous exchanges for the current round
+    if current_round <= len(history) and history[current_round - 1]:
+        parts += ["Previous exchanges in this round:", format_round(debaters, history[current_round - 1]), ""]
+
+    # Add the round number and instructions for the current speaker
+    parts += [
+        f"This is round {current_round} of {max_rounds}.",
+        f"Now, as {debater_name}, provide your argument for this round. Be persuasive, use facts, "
+        "and stay in character. Keep your response concise (1-2 paragraphs maximum)."
+    ]
+
+    return [
+        {"role": "system", "content": prefix},
+        {"role": "user", "content": "\n".join(parts)}
+    ]
@@ -0,0 +1,177 @@
+import json
+import threading
+import time
+from collections import deque
+
+from metrics import METRICS
+
+# Models available for routing
+GEMINI_2_0_FLASH = "gemini-2.0-flash"
+GEMINI_2_0_FLASH_LITE = "gemini-2.0-flash-lite"
+
+# Routing table: the first rule matching the call type and prompt size wins.
+# `models` are tried in order; later models are fallbacks. By default every call
+# goes to gemini-2.0-flash first. Cheaper routes are opt-in through secrets, e.g.
+#
+#   [[routing.routes]]
+#   call_type = "debate_turn"
+#   max_prompt_tokens = 1500
+#   models = ["gemini-2.0-flash-lite", "gemini-2.0-flash"]
+#
+# which replaces this whole table, so list a rule for every call type.
+DEFAULT_ROUTES = [
+    {'call_type': "debate_turn", 'models': [GEMINI_2_0_FLASH, GEMINI_2_0_FLASH_LITE]},
+    {'call_type': "follow_up", 'models': [GEMINI_2_0_FLASH, GEMINI_2_0_FLASH_LITE]},
+    {'call_type': "chat", 'models': [GEMINI_2_0_FLASH, GEMINI_2_0_FLASH_LITE]},
+]
+
+# Default health settings
+DEFAULT_MAX_LATENCY = 10.0
+DEFAULT_COOLDOWN = 60.0
+LATENCY_SMOOTHING = 0.2
+MAX_DECISIONS = 1000
+
+# Error text that marks a rate-limited request
+RATE_LIMIT_MARKERS = ("429", "resourceexhausted", "resource_exhausted", "rate limit", "quota")
+
+
+def is_rate_limited(error):
+    """Return whether an exception looks like a provider rate limit."""
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in RATE_LIMIT_MARKERS)
+
+
+class ModelRouter:
+    def __init__(self, routes=None, hedger=None, cooldown=DEFAULT_COOLDOWN, log_path=None):
+        """
+        Pick the model for each LLM call from a routing table.
+
+        A rule matches on `call_type` and, optionally, `max_prompt_tokens`. Its
+        models are tried in order, skipping models that were recently rate
+        limited and moving models whose smoothed latency exceeds the rule's
+        `max_latency` behind the healthy ones. A slow model is tried first again
+        once it has not been used for `cooldown` seconds. If a call fails, the
+        next model is tried. Every decision is counted in the metrics registry,
+        kept in `decisions` and, if `log_path` is set, appended to a JSONL file.
+
+        Args:
+            routes (list): Rules with call_type, models and optional
+                max_prompt_tokens, temperature and max_latency
+            hedger: Optional `Hedger` used to invoke the chosen model
+            cooldown (float): Seconds a rate-limited model is skipped or a slow one demoted
+            log_path (str): JSONL file to append routing decisions to (optional)
+        """
+        self.routes = [dict(route) for route in (routes or DEFAULT_ROUTES)]
+        self.hedger = hedger
+        self.cooldown = cooldown
+        self.log_path = log_path
+        self.decisions = deque(maxlen=MAX_DECISIONS)
+        self._latency = {}
+        self._observed_at = {}
+        self._cooldown_until = {}
+        self._lock = threading.Lock()
+
+    def match(self, call_type, prompt_tokens):
+        """Return the first rule for a call type and prompt size."""
+        for route in self.routes:
+            if route['call_type'] != call_type:
+                continue
+            if route.get('max_prompt_tokens') and prompt_tokens > route['max_prompt_tokens']:
+                continue
+            return route
+        raise ValueError(f"No route for call type {call_type!r}")
+
+    def candidates(self, route):
+        """Return the rule's models in the order to try them, with the reason for each."""
+        now = time.time()
+        max_latency = route.get('max_latency', DEFAULT_MAX_LATENCY)
+        healthy, slow, limited = [], [], []
+        with self._lock:
+            for model in route['models']:
+                if self._cooldown_until.get(model, 0) > now:
+                    limited.append((model, "rate_limited"))
+                elif (self._latency.get(model, 0) > max_latency
+                      and now - self._observed_at.get(model, 0) < self.cooldown):
+                    slow.append((model, "slow"))
+                else:
+                    healthy.append((model, "healthy"))
+        # Rate-limited models stay as a last resort in case every model is limited
+        return healthy + slow + limited
+
+    def _observe(self, model, seconds=None, rate_limited=False):
+        with self._lock:
+            if seconds is not None:
+                previous = self._latency.get(model)
+                self._latency[model] = seconds if previous is None else (
+                    LATENCY_SMOOTHING * seconds + (1 - LATENCY_SMOOTHING) * previous
+                )
+                self._observed_at[model] = time.time()
+            if rate_limited:
+                self._cooldown_until[model] = time.time() + self.cooldown
+
+    def _log(self, decision):
+        self.decisions.append(decision)
+        METRICS.inc("llm_route_total", call_type=decision['call_type'], model=decision['model'],
+                    outcome=decision['outcome'])
+        if decision['attempt'] > 1:
+            METRICS.inc("llm_route_fallbacks_total", call_type=decision['call_type'], model=decision['model'])
+        if self.log_path:
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(decision) + "\n")
+
+    def invoke(self, call_type, messages, make_model, prompt_tokens=0):
+        """
+        Route a call and invoke the chosen model, falling back on failure.
+
+        Args:
+            call_type (str): "debate_turn", "follow_up" or "chat"
+            messages: Prompt string or messages passed to the model
+            make_model (callable): Returns a chat model for (model name, temperature)
+            prompt_tokens (int): Estimated prompt size used to match rules
+
+        Returns:
+            tuple: (response, name of the model that produced it)
+        """
+        route = self.match(call_type, prompt_tokens)
+        error = None
+        for attempt, (model_name, health) in enumerate(self.candidates(route), start=1):
+            started = time.perf_counter()
+            decision = {
+                'time': time.time(),
+                'call_type': call_type,
+                'prompt_tokens': prompt_tokens,
+                'model': model_name,
+                'health': health,
+                'attempt': attempt
+            }
+            try:
+                model = make_model(model_name, route.get('temperature', 0))
+                if self.hedger is not None:
+                    response = self.hedger.invoke(model, messages, call_type)
+                else:
+                    response = model.invoke(messages)
+            except Exception as e:
+                error = e
+                rate_limited = is_rate_limited(e)
+                self._observe(model_name, rate_limited=rate_limited)
+                self._log({**decision, 'outcome': "rate_limited" if rate_limited else "error",
+                           'seconds': time.perf_counter() - started})
+                continue
+            seconds = time.perf_counter() - started
+            self._observe(model_name, seconds)
+            self._log({**decision, 'outcome': "ok", 'seconds': seconds})
+            return response, model_name
+        raise error
+
+    def stats(self):
+        """Return the smoothed latency and rate-limit state of every model seen."""
+        now = time.time()
+        with self._lock:
+            models = set(self._latency) | set(self._cooldown_until)
+            return {
+                model: {
+                    'latency': self._latency.get(model),
+                    'rate_limited': self._cooldown_until.get(model, 0) > now
+                }
+                for model in sorted(models)
+            }
@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from embedding_cache import normalize
+
+# Default cache settings
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+DEFAULT_TTL_SECONDS = 6 * 60 * 60
+DEFAULT_MAX_ENTRIES = 512
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold=DEFAULT_SIMILARITY_THRESHOLD, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Cache answers keyed by the embedding of the question that produced them.
+
+        Embeddings are stored normalized in a single float32 matrix so a lookup is
+        one matrix-vector product. Entries expire after `ttl_seconds` and the least
+        recently used entry is evicted once `max_entries` is reached.
+
+        Args:
+            threshold (float): Minimum cosine similarity for a cache hit
+            ttl_seconds (float): Time to live of an entry in seconds
+            max_entries (int): Maximum number of cached answers
+        """
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        # The vector index is allocated lazily once the embedding size is known
+        self._vectors = None
+        self._expires_at = np.zeros(max_entries, dtype=np.float64)
+        self._payloads = [None] * max_entries
+
+        # Maps slot -> None, ordered from least to most recently used
+        self._lru = OrderedDict()
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._lru)
+
+    def _release(self, slot):
+        """Free a slot so it can be reused."""
+        self._lru.pop(slot, None)
+        self._payloads[slot] = None
+        self._expires_at[slot] = 0.0
+        self._vectors[slot] = 0.0
+        self._free_slots.append(slot)
+
+    def _evict_expired(self, now):
+        """Drop every entry whose TTL has passed."""
+        for slot in [s for s in self._lru if self._expires_at[s] <= now]:
+            self._release(slot)
+
+    def lookup(self, query_vector):
+        """
+        Return the cached payload for the most similar question, if any.
+
+        Args:
+            query_vector (list): Embedding of the incoming question
+
+        Returns:
+            dict: Cached payload with its `similarity`, or None on a miss
+        """
+        with self._lock:
+            if self._vectors is None or not self._lru:
+                self.misses += 1
+                return None
+
+            now = time.monotonic()
+            self._evict_expired(now)
+
+            slots = np.fromiter(self._lru.keys(), dtype=np.intp, count=len(self._lru))
+            if slots.size == 0:
+                self.misses += 1
+                return None
+
+            scores = self._vectors[slots] @ normalize(query_vector)
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            slot = int(slots[best])
+            self._lru.move_to_end(slot)
+            self.hits += 1
+            return {**self._payloads[slot], "similarity": similarity}
+
+    def add(self, query_vector, payload):
+        """
+        Store a payload for the given question embedding.
+
+        Args:
+            query_vector (list): Embedding of the question
+            payload (dict): Answer, sources and documents to return on a hit
+        """
+        vector = normalize(query_vector)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+            now = time.monotonic()
+            self._evict_expired(now)
+
+            # Evict the least recently used entry when the index is full
+            if not self._free_slots:
+                lru_slot = next(iter(self._lru))
+                self._release(lru_slot)
+
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._payloads[slot] = payload
+            self._expires_at[slot] = now + self.ttl_seconds
+            self._lru[slot] = None
+
+    def clear(self):
+        """Remove every cached entry."""
+        with self._lock:
+            for slot in list(self._lru):
+                self._release(slot)
@@ -0,0 +1,138 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from back_end import get_embeddings, get_vectorstore, retrieve_knowledge, DEBATERS, FOLLOW_UP_K
+from embedding_cache import normalize
+
+# Default speculation budget
+DEFAULT_MAX_QUERIES = 6
+DEFAULT_MAX_SEARCHES = 16
+DEFAULT_TIME_BUDGET = 20.0
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_MATCH_THRESHOLD = 0.8
+
+
+def first_sentence(text):
+    """Return the first sentence of a debate turn."""
+    match = re.match(r"(.+?[.!?])(\s|$)", text.strip(), re.S)
+    return (match.group(1) if match else text.strip())[:300]
+
+
+def candidate_queries(state, max_queries=DEFAULT_MAX_QUERIES):
+    """
+    Return likely follow-up queries for a finished debate.
+
+    Uses the opening claim of each debater's latest turn, newest rounds first,
+    followed by the debate topic.
+    """
+    queries = []
+    for round_data in reversed(state['history']):
+        for debater in state['debaters']:
+            if debater in round_data and round_data[debater]:
+                claim = first_sentence(round_data[debater])
+                if claim and claim not in queries:
+                    queries.append(claim)
+    queries.append(state['topic'])
+    return queries[:max_queries]
+
+
+class SpeculativeRetriever:
+    def __init__(self, max_queries=DEFAULT_MAX_QUERIES, max_searches=DEFAULT_MAX_SEARCHES,
+                 time_budget=DEFAULT_TIME_BUDGET, max_workers=DEFAULT_MAX_WORKERS,
+                 match_threshold=DEFAULT_MATCH_THRESHOLD):
+        """
+        Precompute follow-up retrieval for a finished debate in the background.
+
+        Candidate queries are embedded in one batch, then each debater's
+        namespace is searched for them until the search or time budget runs out
+        or the speculation is cancelled.
+
+        Args:
+            max_queries (int): Maximum number of candidate queries
+            max_searches (int): Maximum number of similarity searches
+            time_budget (float): Seconds after which no new search is started
+            max_workers (int): Number of searches run concurrently
+            match_threshold (float): Cosine similarity needed to reuse a result
+        """
+        self.max_queries = max_queries
+        self.max_searches = max_searches
+        self.time_budget = time_budget
+        self.max_workers = max_workers
+        self.match_threshold = match_threshold
+
+        self.results = {}  # debater -> list of (normalized query vector, results)
+        self.searches = 0
+        self.hits = 0
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, state):
+        """Start speculating for a finished debate state."""
+        self._thread = threading.Thread(target=self._run, args=(state,), name="speculation", daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Stop starting new searches; results found so far stay usable."""
+        self._cancelled.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def lookup(self, query_vector, debater_name):
+        """Return speculated results for a debater if a query matches, else None."""
+        vector = normalize(query_vector)
+        with self._lock:
+            candidates = list(self.results.get(debater_name, []))
+        if not candidates:
+            return None
+
+        scores = np.stack([candidate for candidate, _ in candidates]) @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.match_threshold:
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return candidates[best][1]
+
+    def _run(self, state):
+        deadline = time.monotonic() + self.time_budget
+        debaters = state['debaters']
+
+        # Warm each namespace's vector store connection
+        for debater in debaters:
+            if self._cancelled.is_set():
+                return
+            get_vectorstore(DEBATERS[debater]['namespace'])
+
+        queries = candidate_queries(state, self.max_queries)
+        try:
+            vectors = get_embeddings(os.environ["GOOGLE_API_KEY"]).embed_documents(queries)
+        except Exception:
+            return
+
+        # Interleave debaters so every responder gets some speculation within budget
+        tasks = [(debater, vector) for vector in vectors for debater in debaters][:self.max_searches]
+
+        def search(task):
+            debater, vector = task
+            if self._cancelled.is_set() or time.monotonic() > deadline:
+                return
+            results = retrieve_knowledge("", debater, k=FOLLOW_UP_K, query_vector=vector)
+            if not results:
+                return
+            normalized = normalize(vector)
+            with self._lock:
+                self.searches += 1
+                self.results.setdefault(debater, []).append((normalized, results))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            list(pool.map(search, tasks))
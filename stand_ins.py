@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+
+# Stand-ins for the external services, used by benchmarks and local runs
+
+
+def simulate_latency(latency, jitter=0.0):
+    """Sleep for `latency` seconds, scaled by log-normal noise when `jitter` is set."""
+    if latency:
+        time.sleep(latency * random.lognormvariate(0.0, jitter) if jitter else latency)
+
+
+def message_text(messages):
+    """Flatten a prompt string or a list of role/content messages into text."""
+    if isinstance(messages, str):
+        return messages
+    parts = []
+    for message in messages:
+        if isinstance(message, dict):
+            parts.append(message["content"])
+        else:
+            parts.append(message.content)
+    return "\n".join(parts)
+
+
+class StandInChatModel:
+    """Chat model stand-in that returns a canned reply after an optional delay."""
+
+    def __init__(self, reply="This is a stand-in response.", latency=0.0, jitter=0.0):
+        self.reply = reply
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = []
+
+    def invoke(self, messages, **kwargs):
+        self.calls.append(messages)
+        simulate_latency(self.latency, self.jitter)
+        prompt_tokens = len(message_text(messages)) // 4
+        output_tokens = len(self.reply) // 4
+        return AIMessage(
+            content=self.reply,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": prompt_tokens + output_tokens
+            }
+        )
+
+
+class StandInEmbeddings:
+    """Embeddings stand-in that hashes words into a fixed-size bag-of-words vector."""
+
+    def __init__(self, dimension=256, latency=0.0, jitter=0.0):
+        self.dimension = dimension
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in text.lower().split():
+            digest = hashlib.md5(word.strip(".,!?;:\"'()").encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        simulate_latency(self.latency, self.jitter)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class LocalVectorStore:
+    """
+    In-process stand-in for the Pinecone index, optionally persisted to a JSON file.
+
+    Records are stored per namespace as id -> (values, metadata), with the chunk
+    text under the `text` metadata key like `PineconeVectorStore` expects.
+    """
+
+    def __init__(self, path=None, latency=0.0, jitter=0.0):
+        self.path = path
+        self.latency = latency
+        self.jitter = jitter
+        self.namespaces = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.namespaces = {
+                namespace: {record_id: (values, metadata) for record_id, values, metadata in records}
+                for namespace, records in data.items()
+            }
+
+    def upsert(self, namespace, vectors):
+        """Insert or replace (id, values, metadata) tuples in a namespace."""
+        simulate_latency(self.latency, self.jitter)
+        with self._lock:
+            records = self.namespaces.setdefault(namespace, {})
+            for record_id, values, metadata in vectors:
+                records[record_id] = (list(values), dict(metadata))
+
+    def delete(self, namespace, ids):
+        """Delete records by id from a namespace."""
+        simulate_latency(self.latency, self.jitter)
+        with self._lock:
+            records = self.namespaces.get(namespace, {})
+            for record_id in ids:
+                records.pop(record_id, None)
+
+    def count(self, namespace):
+        with self._lock:
+            return len(self.namespaces.get(namespace, {}))
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                namespace: [[record_id, values, metadata] for record_id, (values, metadata) in records.items()]
+                for namespace, records in self.namespaces.items()
+            }
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    def as_namespace(self, namespace, embedding):
+        """Return a vector store view of one namespace with the LangChain search methods."""
+        return LocalNamespaceStore(self, namespace, embedding)
+
+
+class LocalNamespaceStore:
+    """A single namespace of a `LocalVectorStore`, searchable like `PineconeVectorStore`."""
+
+    def __init__(self, store, namespace, embedding):
+        self.store = store
+        self.namespace = namespace
+        self.embedding = embedding
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        simulate_latency(self.store.latency, self.store.jitter)
+        with self.store._lock:
+            records = list(self.store.namespaces.get(self.namespace, {}).values())
+        if not records:
+            return []
+
+        matrix = np.asarray([values for values, _ in records], dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        scores = matrix @ query / np.where(norms == 0, 1.0, norms)
+
+        documents = []
+        for idx in np.argsort(-scores)[:k]:
+            metadata = dict(records[idx][1])
+            text = metadata.pop("text", "")
+            documents.append(Document(page_content=text, metadata=metadata))
+        return documents
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k=k)
@@ -1,8 +1,63 @@
 import streamlit as st
 import os
 import time
-from back_end import DEBATERS, generate_debate, handle_follow_up_question
-from utils import check_password, save_feedback
+import uuid
+from archive import DebateArchive
+from back_end import DEBATERS, generate_debate, handle_follow_up_question, warm_up_stages
+from cancellation import CancellationToken
+from convergence import DEFAULT_NOVELTY_THRESHOLD
+from job_executor import JobExecutor, QueueFullError, QUEUED, DONE, FAILED, CANCELLED
+from speculation import SpeculativeRetriever
+from usage import summarize_usage
+from utils import (check_password, save_feedback, profile_next_request, start_profiling, finish_profiling,
+                   render_profile, show_warm_up_status)
+from warmup import WarmUp
+
+# Maximum seconds between polls of a running job; a poll returns as soon as the job finishes
+JOB_POLL_INTERVAL = 1.0
+
+# Novelty below which a repeated argument ends the debate early, tuned with `[convergence]` in secrets
+CONVERGENCE_THRESHOLD = st.secrets.get("convergence", {}).get("threshold", DEFAULT_NOVELTY_THRESHOLD)
+
+# Maximum tokens for a debate and its follow-ups, 0 for unlimited
+DEBATE_TOKEN_BUDGET = st.secrets.get("budget", {}).get("debate_tokens", 0)
+
+# Opt-in precomputation of follow-up retrieval once a debate completes
+SPECULATION_ENABLED = st.secrets.get("speculation", {}).get("enabled", False)
+
+# Archive of precomputed debates served by the gallery
+GALLERY_PATH = st.secrets.get("gallery", {}).get("path", "gallery/debates.gda")
+
+# Process-wide executor shared by every session
+@st.cache_resource
+def get_job_executor():
+    return JobExecutor()
+
+# Follow-ups get their own workers so a short answer never waits behind full debates
+@st.cache_resource
+def get_follow_up_executor():
+    return JobExecutor(name="follow-up-job")
+
+# Process-wide gallery archive; its index is read on first use
+@st.cache_resource
+def get_gallery():
+    return DebateArchive(GALLERY_PATH)
+
+# Warm up once per process in the background, while the first user logs in
+@st.cache_resource
+def get_warm_up():
+    gallery = get_gallery()
+    return WarmUp(warm_up_stages() + [("Debate gallery", lambda: gallery.index)]).start()
+
+# Load an archived debate into the session
+def open_archived_debate(entry_id):
+    """Show a precomputed debate; follow-up questions still run live, within this server's budget."""
+    st.session_state["debate_state"] = get_gallery().load(entry_id)
+    st.session_state["debate_state"]["token_budget"] = DEBATE_TOKEN_BUDGET
+    st.session_state["debate_completed"] = True
+    st.session_state["debate_job_id"] = None
+    if SPECULATION_ENABLED:
+        st.session_state["speculation"] = SpeculativeRetriever().start(st.session_state["debate_state"])
 
 # Setup sidebar with instructions and feedback form
 def setup_sidebar():
@@ -69,6 +124,46 @@ def setup_sidebar():
     except:
         pass
 
+# Describe the latest progress event of a debate job
+def describe_progress(event):
+    """Return the progress bar text for a debate progress event."""
+    if event["stage"] == "retrieval":
+        return f"📚 Retrieved knowledge for {event['debater']} ({event['completed']}/{event['total']} steps)"
+    return (f"🎙️ Round {event['round']}: {event['debater']} has spoken "
+            f"({event['completed']}/{event['total']} steps, {event['tokens']:,} tokens so far)")
+
+# Show the retrieval failures recorded by a debate or follow-up job
+def show_retrieval_errors(debate_state):
+    """Show the failed retrievals of a finished job once, then forget them."""
+    for message in debate_state.get('retrieval_errors', []):
+        st.error(message)
+    debate_state['retrieval_errors'] = []
+
+# Show token usage totals for a debate
+def render_usage(debate_state):
+    """Show token usage per debater and round."""
+    summary = summarize_usage(debate_state.get("usage", []))
+    if not summary["calls"]:
+        return
+
+    budget = debate_state.get("token_budget")
+    budget_text = f" of {budget:,} budget" if budget else ""
+    with st.expander(f"📊 Token usage: {summary['total']:,} tokens{budget_text} in {summary['calls']} calls"):
+        st.markdown(f"**Input:** {summary['input']:,} tokens &nbsp; **Output:** {summary['output']:,} tokens")
+        if summary["by_model"]:
+            st.caption(" · ".join(f"{model}: {tokens:,}" for model, tokens in summary["by_model"].items()))
+        cols = st.columns(2)
+        with cols[0]:
+            st.markdown("**By debater**")
+            for debater, tokens in summary["by_debater"].items():
+                st.markdown(f"- {debater}: {tokens:,}")
+        with cols[1]:
+            st.markdown("**By round**")
+            for round_num, tokens in sorted(summary["by_round"].items()):
+                st.markdown(f"- Round {round_num}: {tokens:,}")
+            if "follow_up" in summary["by_call_type"]:
+                st.markdown(f"- Follow-ups: {summary['by_call_type']['follow_up']:,}")
+
 def main():
     """Main application function."""
     # Set page configuration (must be the first Streamlit command)
@@ -90,12 +185,25 @@ def main():
         st.session_state["selected_responders"] = []
     if "process_follow_up" not in st.session_state:
         st.session_state["process_follow_up"] = False
+    if "session_id" not in st.session_state:
+        st.session_state["session_id"] = uuid.uuid4().hex
+    if "debate_job_id" not in st.session_state:
+        st.session_state["debate_job_id"] = None
+    if "speculation" not in st.session_state:
+        st.session_state["speculation"] = None
+    if "follow_up_job_id" not in st.session_state:
+        st.session_state["follow_up_job_id"] = None
+    if "profiling" not in st.session_state:
+        st.session_state["profiling"] = None
 
     setup_sidebar()
+    show_warm_up_status(get_warm_up())
 
     if not check_password():
         st.stop()
 
+    profile_next_request()
+
     # Custom CSS for styling
     st.markdown("""
     <style>
@@ -157,6 +265,20 @@ def main():
     Select 2-4 debaters, set the number of rounds, and enter a debate topic to get started.
     """)
 
+    # Precomputed debates open instantly without any LLM calls
+    gallery = get_gallery()
+    gallery_entries = gallery.entries() if gallery.exists() else []
+    if gallery_entries and st.session_state["debate_state"] is None:
+        with st.expander("🖼️ Debate Gallery: open a ready-made debate instantly"):
+            labels = {
+                entry["id"]: f"{entry['topic']} ({', '.join(entry['debaters'])}, {entry['rounds']} rounds)"
+                for entry in gallery_entries
+            }
+            selected_entry = st.selectbox("Choose a debate", options=list(labels), format_func=labels.get)
+            if st.button("Open Debate", key="open_gallery_debate"):
+                open_archived_debate(selected_entry)
+                st.rerun()
+
     # UI for selecting debaters
     st.subheader("Select Debaters (2-4)")
     selected_debaters = st.multiselect(
@@ -184,6 +306,13 @@ def main():
     # Number of rounds
     num_rounds = st.slider("Number of debate rounds", min_value=1, max_value=5, value=3)
 
+    # Optional early termination once debaters start repeating themselves
+    stop_on_convergence = st.checkbox(
+        "End the debate early when arguments start repeating",
+        value=False,
+        help="Compares each debater's new argument with their earlier ones after every round"
+    )
+
     # Debate topic
     debate_topic = st.text_input("Enter debate topic", "The future of artificial intelligence")
 
@@ -195,77 +324,139 @@ def main():
 
     # Process follow-up if flag is set
     if st.session_state["process_follow_up"]:
-        with st.spinner("Processing follow-up question..."):
-            # Get the question and responders from session state
-            question = st.session_state["follow_up_question"]
-            responders = st.session_state["selected_responders"]
-
-            if question and responders:
-                # Update the debate state with the user's question and the responses
-                st.session_state["debate_state"] = handle_follow_up_question(
+        # Get the question and responders from session state
+        question = st.session_state["follow_up_question"]
+        responders = st.session_state["selected_responders"]
+
+        # Only one follow-up runs at a time, since answers update the debate state in place
+        if st.session_state["follow_up_job_id"] is not None:
+            st.warning("Please wait for the current follow-up question to be answered.")
+        elif question and responders:
+            # Stop speculating; results gathered so far are still used
+            speculation = st.session_state["speculation"]
+            if speculation is not None:
+                speculation.cancel()
+
+            # Answer on the follow-up executor so a restart or a closed tab can cancel it
+            profiler = start_profiling()
+            try:
+                job = get_follow_up_executor().submit(
+                    st.session_state["session_id"],
+                    ("follow_up", question, tuple(responders)),
+                    handle_follow_up_question,
                     st.session_state["debate_state"],
                     question,
-                    responders
+                    responders,
+                    speculation=speculation,
+                    cancel_token=CancellationToken()
                 )
+                st.session_state["follow_up_job_id"] = job.id
+                if profiler is not None:
+                    st.session_state["profiling"] = {"profiler": profiler, "name": "follow_up", "job_id": job.id}
+            except QueueFullError as e:
+                if profiler is not None:
+                    profiler.stop()
+                st.warning(str(e))
+
+            # Clear the inputs after processing
+            st.session_state["follow_up_question"] = ""
+            st.session_state["selected_responders"] = []
 
-                # Clear the inputs after processing
-                st.session_state["follow_up_question"] = ""
-                st.session_state["selected_responders"] = []
+        # Reset the processing flag
+        st.session_state["process_follow_up"] = False
 
-            # Reset the processing flag
-            st.session_state["process_follow_up"] = False
+    # Show the follow-up answer once its job has finished
+    if st.session_state["follow_up_job_id"] is not None:
+        job = get_follow_up_executor().get(st.session_state["follow_up_job_id"])
+        if job is None or not job.active:
+            st.session_state["follow_up_job_id"] = None
+            if job is not None and job.status == DONE:
+                st.session_state["debate_state"] = job.result
+                show_retrieval_errors(job.result)
+            elif job is not None and job.status == FAILED:
+                st.error(f"An error occurred while answering: {str(job.error)}")
 
     # Run the debate when the user clicks the button
     if st.button(button_text, type="primary", disabled=len(selected_debaters) < 2 or len(selected_debaters) > 4, key="main_debate_button"):
         if st.session_state["debate_state"] is not None:
-            # Reset the debate if we already have one
+            # Reset the debate if we already have one, cancelling any work still running for it
+            get_job_executor().cancel_session(st.session_state["session_id"], reason="restarted")
+            get_follow_up_executor().cancel_session(st.session_state["session_id"], reason="restarted")
             st.session_state["debate_state"] = None
             st.session_state["debate_completed"] = False
             st.session_state["follow_up_question"] = ""
             st.session_state["selected_responders"] = []
             st.session_state["process_follow_up"] = False
+            st.session_state["debate_job_id"] = None
+            st.session_state["follow_up_job_id"] = None
+            if st.session_state["speculation"] is not None:
+                st.session_state["speculation"].cancel()
+                st.session_state["speculation"] = None
             st.rerun()
+        elif not stop_on_convergence and gallery.exists() and gallery.find(debate_topic, selected_debaters, num_rounds):
+            # Serve a precomputed debate with the same configuration
+            open_archived_debate(gallery.find(debate_topic, selected_debaters, num_rounds))
         else:
-            # Show a progress bar for better UX
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-
+            # Run the debate on the shared executor so reruns do not interrupt it
+            profiler = start_profiling()
             try:
-                status_text.text("Initializing debate...")
-                progress_bar.progress(10)
-                time.sleep(0.5)
-
-                # Initialize QA engine for knowledge retrieval
-                status_text.text("Retrieving knowledge from database...")
-                progress_bar.progress(30)
-
-                # Create and run the real debate
-                status_text.text("Generating debate content...")
-                final_state = generate_debate(
+                executor = get_job_executor()
+                previous_job_id = st.session_state["debate_job_id"]
+                job = executor.submit(
+                    st.session_state["session_id"],
+                    (debate_topic, tuple(selected_debaters), num_rounds, stop_on_convergence),
+                    generate_debate,
                     topic=debate_topic,
                     debaters=selected_debaters,
-                    num_rounds=num_rounds
+                    num_rounds=num_rounds,
+                    convergence_threshold=CONVERGENCE_THRESHOLD if stop_on_convergence else None,
+                    token_budget=DEBATE_TOKEN_BUDGET,
+                    cancel_token=CancellationToken(),
+                    track_progress=True
                 )
-
-                # Store the debate state in session state
-                st.session_state["debate_state"] = final_state
-                st.session_state["debate_completed"] = True
-
-                progress_bar.progress(90)
-                time.sleep(0.5)
-
-                # Complete
-                status_text.text("Debate generation complete!")
-                progress_bar.progress(100)
-                time.sleep(1)
-
-                # Clear the progress indicators
-                progress_bar.empty()
-                status_text.empty()
-
-            except Exception as e:
-                st.error(f"An error occurred: {str(e)}")
-                st.error("Please make sure you've set up your Google API key correctly and that you have access to the Gemini API.")
+                # A debate started with different settings replaces the one still running
+                if previous_job_id is not None and previous_job_id != job.id:
+                    executor.cancel(previous_job_id, reason="restarted")
+                st.session_state["debate_job_id"] = job.id
+                if profiler is not None:
+                    st.session_state["profiling"] = {"profiler": profiler, "name": "debate", "job_id": job.id}
+            except QueueFullError as e:
+                if profiler is not None:
+                    profiler.stop()
+                st.warning(str(e))
+
+    # Poll the debate job until it finishes
+    if st.session_state["debate_job_id"] is not None:
+        executor = get_job_executor()
+        job = executor.get(st.session_state["debate_job_id"])
+
+        if job is None or job.status == CANCELLED:
+            st.session_state["debate_job_id"] = None
+            st.error("The debate job expired before it finished. Please start a new debate.")
+        elif job.status == DONE:
+            # Store the debate state in session state
+            st.session_state["debate_state"] = job.result
+            st.session_state["debate_completed"] = True
+            st.session_state["debate_job_id"] = None
+            show_retrieval_errors(job.result)
+
+            # Warm retrieval for likely follow-up questions while the user reads
+            if SPECULATION_ENABLED:
+                st.session_state["speculation"] = SpeculativeRetriever().start(job.result)
+        elif job.status == FAILED:
+            st.session_state["debate_job_id"] = None
+            st.error(f"An error occurred: {str(job.error)}")
+            st.error("Please make sure you've set up your Google API key correctly and that you have access to the Gemini API.")
+        else:
+            if job.status == QUEUED:
+                position = executor.queue_position(job.id)
+                st.info(f"⏳ Waiting for a free worker ({position} debate(s) ahead of yours)...")
+            elif job.progress is None:
+                st.info(f"🎙️ Generating debate content... ({int(time.time() - job.started_at)}s)")
+            else:
+                st.progress(job.progress["fraction"], text=describe_progress(job.progress))
+            job.wait(JOB_POLL_INTERVAL)
+            st.rerun()
 
     # Display the debate if it exists
     if st.session_state["debate_state"] is not None:
@@ -298,6 +489,13 @@ def main():
                     fallback = f"As {debater}, I believe this topic requires careful consideration."
                     st.markdown(f"<div class='debater {debater_class}'><strong>{debater}:</strong> {fallback}</div>", unsafe_allow_html=True)
 
+        # Explain an early finish
+        if st.session_state["debate_state"].get("stop_reason") == "converged":
+            completed_rounds = len([exchange for exchange in st.session_state["debate_state"]["history"] if exchange])
+            st.info(f"🔁 The debate ended after round {completed_rounds} because the debaters were repeating their earlier arguments.")
+        elif st.session_state["debate_state"].get("stop_reason") == "budget":
+            st.warning("⚠️ The debate ended early because it reached its token budget.")
+
         # Display user follow-up questions and responses
         if st.session_state["debate_state"]["user_questions"]:
             st.markdown(f"<div class='round-header'><h3>Follow-up Discussion</h3></div>", unsafe_allow_html=True)
@@ -320,6 +518,8 @@ def main():
                                 st.markdown(f"**Content:** {source['content']}")
                                 st.markdown("---")
 
+        render_usage(st.session_state["debate_state"])
+
     # Add follow-up question section if debate is completed (separate from debate content)
     if st.session_state["debate_completed"] and st.session_state["debate_state"] is not None:
         st.markdown("### Join the Conversation")
@@ -336,8 +536,11 @@ def main():
                 default=[st.session_state["debate_state"]["debaters"][0]]
             )
 
-            # Submit button
-            submitted = st.form_submit_button("Submit Question")
+            # Submit button, disabled until the previous follow-up has been answered
+            submitted = st.form_submit_button(
+                "Submit Question",
+                disabled=st.session_state["follow_up_job_id"] is not None
+            )
 
             if submitted:
                 if question and responders:
@@ -351,5 +554,23 @@ def main():
                 else:
                     st.warning("Please select at least one debater to respond.")
 
+    # Save the profile once the profiled job has finished and its result has been rendered
+    if st.session_state["profiling"] is not None:
+        profiling = st.session_state["profiling"]
+        executor = get_follow_up_executor() if profiling["name"] == "follow_up" else get_job_executor()
+        job = executor.get(profiling["job_id"])
+        if job is None or not job.active:
+            finish_profiling(profiling["profiler"], profiling["name"])
+            st.session_state["profiling"] = None
+    render_profile()
+
+    # Wait for the follow-up below the page so the debate stays visible while it runs
+    if st.session_state["follow_up_job_id"] is not None:
+        job = get_follow_up_executor().get(st.session_state["follow_up_job_id"])
+        if job is not None:
+            with st.spinner("Processing follow-up question..."):
+                job.wait(JOB_POLL_INTERVAL)
+        st.rerun()
+
 if __name__ == "__main__":
     main()
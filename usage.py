@@ -0,0 +1,124 @@
+import threading
+
+from metrics import METRICS
+from prompt_builder import CHARS_PER_TOKEN
+
+# Tokens reserved for the reply when checking a budget
+EXPECTED_OUTPUT_TOKENS = 200
+
+
+class TokenBudgetExceeded(Exception):
+    """Raised when a call would exceed the session's token budget."""
+
+
+class TokenReservations:
+    """
+    Tokens set aside for calls running in parallel against one budget.
+
+    A call checks the budget against the tokens already spent plus those
+    reserved by calls still in flight, reserves its own estimate while holding
+    `lock`, and releases it once its usage is recorded.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = 0
+
+    def release(self, tokens):
+        with self.lock:
+            self.tokens -= tokens
+
+
+def estimate_tokens(messages):
+    """Estimate the token count of a prompt string or a list of role/content messages."""
+    if isinstance(messages, str):
+        return len(messages) // CHARS_PER_TOKEN
+    return sum(len(message["content"]) for message in messages) // CHARS_PER_TOKEN
+
+
+def extract_usage(response):
+    """Return input, output and total token counts from a chat model response."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    input_tokens = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
+    return {
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'total_tokens': usage.get("total_tokens", input_tokens + output_tokens)
+    }
+
+
+def record_usage(usage_log, response, app, call_type, debater=None, round_num=None, model=None):
+    """
+    Append the token usage of a response to a usage log and the process metrics.
+
+    Args:
+        usage_log (list): Usage entries of a debate or chatbot session
+        response: Chat model response with `usage_metadata`
+        app (str): "simulator" or "chatbot"
+        call_type (str): "debate_turn", "follow_up" or "chat"
+        debater (str): Debater who produced the response
+        round_num (int): Debate round, for debate turns
+        model (str): Model that produced the response, if routed
+
+    Returns:
+        dict: The recorded entry
+    """
+    entry = {
+        'call_type': call_type,
+        'debater': debater,
+        'round': round_num,
+        'model': model,
+        **extract_usage(response)
+    }
+    usage_log.append(entry)
+
+    METRICS.inc("llm_calls_total", app=app, call_type=call_type)
+    METRICS.inc("llm_tokens_total", entry['input_tokens'], app=app, call_type=call_type, kind="input")
+    METRICS.inc("llm_tokens_total", entry['output_tokens'], app=app, call_type=call_type, kind="output")
+    if model:
+        METRICS.inc("llm_model_tokens_total", entry['total_tokens'], app=app, model=model)
+    return entry
+
+
+def total_tokens(usage_log, call_type=None):
+    """Return the total tokens in a usage log, optionally for one call type."""
+    return sum(entry['total_tokens'] for entry in usage_log
+               if call_type is None or entry['call_type'] == call_type)
+
+
+def summarize_usage(usage_log):
+    """Aggregate a usage log per debater, per round, per call type and per model."""
+    summary = {'total': 0, 'input': 0, 'output': 0, 'calls': 0,
+               'by_debater': {}, 'by_round': {}, 'by_call_type': {}, 'by_model': {}}
+    for entry in usage_log:
+        summary['total'] += entry['total_tokens']
+        summary['input'] += entry['input_tokens']
+        summary['output'] += entry['output_tokens']
+        summary['calls'] += 1
+        if entry['debater']:
+            summary['by_debater'][entry['debater']] = summary['by_debater'].get(entry['debater'], 0) + entry['total_tokens']
+        if entry['round']:
+            summary['by_round'][entry['round']] = summary['by_round'].get(entry['round'], 0) + entry['total_tokens']
+        summary['by_call_type'][entry['call_type']] = summary['by_call_type'].get(entry['call_type'], 0) + entry['total_tokens']
+        if entry.get('model'):
+            summary['by_model'][entry['model']] = summary['by_model'].get(entry['model'], 0) + entry['total_tokens']
+    return summary
+
+
+def budget_action(spent, prompt_tokens, budget):
+    """
+    Decide whether a call fits in a token budget.
+
+    Returns:
+        str: "ok" if the call fits, "shrink" if the prompt must be smaller and
+        "stop" if even an empty prompt would exceed the budget. A budget of 0
+        or None is unlimited.
+    """
+    if not budget:
+        return "ok"
+    if spent + prompt_tokens + EXPECTED_OUTPUT_TOKENS <= budget:
+        return "ok"
+    if spent + EXPECTED_OUTPUT_TOKENS < budget:
+        return "shrink"
+    return "stop"
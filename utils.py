@@ -3,24 +3,41 @@ import json
 from oauth2client.service_account import ServiceAccountCredentials
 import streamlit as st
 import hmac
+from feedback_queue import FeedbackQueue
+from profiling import SamplingProfiler
 
 
-# Function to save feedback to a file
-def save_feedback(feedback_text):
+FEEDBACK_SHEET_ID = '1qnFzZZ7YI-9pXj3iAXafjRmC_EIQyK9gA98AjMv29DM'
+FEEDBACK_WORKSHEET = "groupdebating"
+
+
+# Authorize the Google Sheets client once per process
+@st.cache_resource
+def get_gspread_client():
     # Load the credentials from the secrets
     credentials_data = st.secrets["gcp"]["service_account_json"]
-    # print(credentials_data)
     creds = json.loads(credentials_data, strict=False)
 
     # Set up the Google Sheets API credentials
     scope = ["https://www.googleapis.com/auth/drive", "https://www.googleapis.com/auth/spreadsheets"]
     credentials = ServiceAccountCredentials.from_json_keyfile_dict(creds, scope)
-    client = gspread.authorize(credentials)
+    return gspread.authorize(credentials)
+
+
+# Open the feedback worksheet with the cached client
+def open_feedback_sheet():
+    return get_gspread_client().open_by_key(FEEDBACK_SHEET_ID).worksheet(FEEDBACK_WORKSHEET)
+
+
+# Process-wide background queue that batches feedback rows into the sheet
+@st.cache_resource
+def get_feedback_queue():
+    return FeedbackQueue(open_feedback_sheet)
+
 
-    # Open the Google Sheet
-    sheet_id = '1qnFzZZ7YI-9pXj3iAXafjRmC_EIQyK9gA98AjMv29DM'
-    sheet = client.open_by_key(sheet_id).worksheet("groupdebating")
-    sheet.append_row([feedback_text])
+# Function to save feedback without blocking on the sheet
+def save_feedback(feedback_text):
+    get_feedback_queue().submit(feedback_text)
        
     
 # Password checking function
@@ -45,3 +62,112 @@ def check_password():
     return False
 
 
+# Show the progress of the background warm-up in the sidebar
+def show_warm_up_status(warm_up):
+    """Show how far the warm-up has got, and which stages failed once it is done."""
+    stages = warm_up.status()
+    finished = [stage for stage in stages if stage["state"] in ("done", "failed")]
+    if not warm_up.done:
+        running = next((stage["name"] for stage in stages if stage["state"] == "running"), "")
+        st.sidebar.caption(f"🔥 Warming up ({len(finished)}/{len(stages)}): {running}")
+        return
+
+    seconds = sum(stage["seconds"] or 0 for stage in stages)
+    failed = [stage["name"] for stage in stages if stage["state"] == "failed"]
+    if failed:
+        st.sidebar.caption(f"⚠️ Ready in {seconds:.1f}s; warm-up failed for {', '.join(failed)}")
+    else:
+        st.sidebar.caption(f"✅ Ready (warmed up in {seconds:.1f}s)")
+
+
+# Admin password checking function, offered only when `admin_password` is set
+def check_admin_password():
+    """Returns `True` if the user unlocked the admin tools."""
+    if "admin_password" not in st.secrets:
+        return False
+
+    def admin_password_entered():
+        """Checks whether the admin password entered by the user is correct."""
+        if hmac.compare_digest(st.session_state["admin_password"], st.secrets["admin_password"]):
+            st.session_state["admin_correct"] = True
+            del st.session_state["admin_password"]  # Don't store the password.
+        else:
+            st.session_state["admin_correct"] = False
+
+    if st.session_state.get("admin_correct", False):
+        return True
+
+    with st.sidebar.expander("🛠️ Admin"):
+        st.text_input(
+            "Admin password", type="password", on_change=admin_password_entered, key="admin_password"
+        )
+        if "admin_correct" in st.session_state:
+            st.error("😕 Admin password incorrect")
+    return False
+
+
+# Admin toggle that profiles the next request
+def profile_next_request():
+    """Returns `True` if an admin asked for the next request to be profiled."""
+    if not check_admin_password():
+        return False
+
+    # The toggle can only be switched off before it is drawn, so a used toggle is reset here
+    if st.session_state.pop("profile_used", False):
+        st.session_state["profile_next"] = False
+    return st.sidebar.toggle(
+        "🔬 Profile the next request",
+        key="profile_next",
+        help="Samples where the time goes (Python code, network waits, rendering) and saves a flamegraph profile"
+    )
+
+
+# Start the profiler if the admin asked for it; it profiles one request only
+def start_profiling():
+    if not st.session_state.get("profile_next", False) or st.session_state.get("profile_used", False):
+        return None
+    st.session_state["profile_used"] = True
+    return SamplingProfiler().start()
+
+
+# Stop a profiler, save its flamegraph profile and keep its summary for display
+def finish_profiling(profiler, name):
+    profiler.stop()
+    summary = profiler.summary()
+    summary["name"] = name
+    summary["folded"] = profiler.folded()
+    try:
+        summary["path"] = profiler.save(name)
+    except OSError:
+        summary["path"] = None
+    st.session_state["profile"] = summary
+
+
+# Show the summary of the latest profile
+def render_profile():
+    """Show the hottest functions of the latest profile and offer it for download."""
+    summary = st.session_state.get("profile")
+    if not summary:
+        return
+
+    with st.expander(f"🔬 Profile of the last {summary['name']}: {summary['seconds']:.1f}s, "
+                     f"{summary['samples']:,} samples"):
+        st.markdown(f"**Waiting on network, locks or sleeps:** {summary['waiting']:.0%} &nbsp; "
+                    f"**Running Python:** {1 - summary['waiting']:.0%}")
+        cols = st.columns(2)
+        with cols[0]:
+            st.markdown("**Hottest functions (self)**")
+            for label, share in summary["self"]:
+                st.markdown(f"- {share:.1%} `{label}`")
+        with cols[1]:
+            st.markdown("**Hottest functions (total)**")
+            for label, share in summary["total"]:
+                st.markdown(f"- {share:.1%} `{label}`")
+        st.download_button(
+            "📥 Download flamegraph profile",
+            summary["folded"],
+            file_name=f"{summary['name']}.folded",
+            help="Collapsed stacks for flamegraph.pl, speedscope or inferno"
+        )
+        if summary["path"]:
+            st.caption(f"Saved to {summary['path']}")
@@ -0,0 +1,65 @@
+import threading
+import time
+
+from metrics import METRICS
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class WarmUp:
+    def __init__(self, stages):
+        """
+        Do cold-start work in the background before the first request needs it.
+
+        Stages run in order on a daemon thread, typically while the first user
+        is typing the password. A failed stage is recorded and skipped: the
+        request that needs it pays the cold-start cost itself, as it would
+        without a warm-up.
+
+        Args:
+            stages (list): (name, callable) pairs
+        """
+        self.stages = [{'name': name, 'state': PENDING, 'seconds': None, 'error': None} for name, _ in stages]
+        self._fns = [fn for _, fn in stages]
+        self._finished = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self._finished.is_set()
+
+    def start(self):
+        """Start warming up in the background and return self."""
+        self._thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Wait for the warm-up to finish; return whether it did."""
+        return self._finished.wait(timeout)
+
+    def _run(self):
+        try:
+            for stage, fn in zip(self.stages, self._fns):
+                with self._lock:
+                    stage['state'] = RUNNING
+                started = time.perf_counter()
+                try:
+                    fn()
+                    state, error = DONE, None
+                except Exception as e:
+                    state, error = FAILED, f"{type(e).__name__}: {e}"
+                with self._lock:
+                    stage.update(state=state, seconds=time.perf_counter() - started, error=error)
+                METRICS.inc("warmup_stages_total", stage=stage['name'], outcome=state)
+        finally:
+            self._finished.set()
+
+    def status(self):
+        """Return a copy of every stage's name, state, duration and error."""
+        with self._lock:
+            return [dict(stage) for stage in self.stages]